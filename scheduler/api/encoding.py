@@ -0,0 +1,55 @@
+"""
+Lean JSON encoding of GraphQL responses.
+"""
+import json
+
+# Built once: compact separators, no ASCII escaping and no circular reference
+# bookkeeping keep the C encoder on its fastest path.
+LEAN_ENCODER = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False, check_circular=False)
+
+STREAM_CHUNK_SIZE = 64 * 1024
+# Edges are encoded in slices, one encoder call per edge costs more than it saves.
+EDGES_PER_SLICE = 256
+
+
+def encode(value):
+    """Returns the compact JSON encoding of the value."""
+    return LEAN_ENCODER.encode(value)
+
+
+def _iter_parts(value):
+    """Yields the JSON encoding of the value, connection edges a slice at a time."""
+    if not isinstance(value, dict):
+        yield LEAN_ENCODER.encode(value)
+        return
+
+    yield "{"
+    for index, (key, item) in enumerate(value.items()):
+        yield ("," if index else "") + LEAN_ENCODER.encode(key) + ":"
+        if key == "edges" and isinstance(item, list):
+            yield "["
+            for start in range(0, len(item), EDGES_PER_SLICE):
+                # Strip the brackets of the encoded slice.
+                yield ("," if start else "") + LEAN_ENCODER.encode(item[start:start + EDGES_PER_SLICE])[1:-1]
+            yield "]"
+        else:
+            yield from _iter_parts(item)
+    yield "}"
+
+
+def iter_encode(value, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Yields the compact JSON encoding of the value in chunks of about `chunk_size` characters.
+
+    Connection edges are encoded a slice at a time, so the whole response is never
+    held as a single string.
+    """
+    buffer, buffered = [], 0
+    for part in _iter_parts(value):
+        buffer.append(part)
+        buffered += len(part)
+        if buffered >= chunk_size:
+            yield "".join(buffer)
+            buffer, buffered = [], 0
+    if buffer:
+        yield "".join(buffer)
@@ -0,0 +1,43 @@
+"""
+Request metrics of GraphQL operations, see `meeting_scheduler/metrics.py`.
+"""
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+
+from scheduler.meeting_scheduler import metrics
+
+
+def _error_type(error):
+    return type(getattr(error, "original_error", None) or error).__name__
+
+
+@contextmanager
+def track_operation(operation_name):
+    """
+    Records the latency, database query count and errors of the operation executed in the block.
+    Yields a list, the execution result appended to it has its errors counted.
+    """
+    operation_name = operation_name or "anonymous"
+    queries = [0]
+
+    def count_queries(execute, sql, params, many, context):
+        queries[0] += 1
+        return execute(sql, params, many, context)
+
+    results = []
+    started = time.perf_counter()
+    try:
+        with connection.execute_wrapper(count_queries):
+            yield results
+    except Exception as error:
+        metrics.inc("graphql_errors_total", operation=operation_name, type=_error_type(error))
+        raise
+    finally:
+        metrics.observe("graphql_request_duration_seconds", time.perf_counter() - started, operation=operation_name)
+        metrics.observe("graphql_request_db_queries", queries[0], operation=operation_name)
+        for result in results:
+            for error in getattr(result, "errors", None) or ():
+                metrics.inc("graphql_errors_total", operation=operation_name, type=_error_type(error))
+        metrics.flush(force=False)
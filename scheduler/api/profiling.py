@@ -0,0 +1,106 @@
+"""
+On-demand cProfile capture of GraphQL operations.
+
+An operation is profiled when the request carries a valid signed
+`X-GraphQL-Profile` header (see `python manage.py graphql_profiles --token`),
+or for a sampled share of the traffic. Each capture writes a pstats file and a
+top-N text summary named after the operation.
+"""
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+from django.conf import settings
+from django.core import signing
+from graphql import parse
+from graphql.language.ast import OperationDefinition
+
+PROFILE_HEADER = "HTTP_X_GRAPHQL_PROFILE"
+TOKEN_SALT = "scheduler.api.profiling"
+TOKEN_VALUE = "profile"
+
+
+def make_token():
+    """Returns a signed value for the profile header, valid for `TOKEN_MAX_AGE` seconds."""
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign(TOKEN_VALUE)
+
+
+def should_profile(request):
+    """Checks if the request carries a valid profile header or is sampled."""
+    token = request.META.get(PROFILE_HEADER)
+    if token:
+        try:
+            return signing.TimestampSigner(salt=TOKEN_SALT).unsign(
+                token, max_age=settings.GRAPHQL_PROFILING["TOKEN_MAX_AGE"]
+            ) == TOKEN_VALUE
+        except signing.BadSignature:
+            return False
+    sample_rate = settings.GRAPHQL_PROFILING["SAMPLE_RATE"]
+    return sample_rate > 0 and random.random() < sample_rate
+
+
+@lru_cache(maxsize=256)
+def get_operation_name(query):
+    """Returns the name of the first named operation of the query, if any."""
+    try:
+        document = parse(query)
+    except Exception:  # pylint: disable=broad-except
+        return None
+    for definition in document.definitions:
+        if isinstance(definition, OperationDefinition) and definition.name:
+            return definition.name.value
+    return None
+
+
+def profile_path(operation_name):
+    """Returns the path prefix of a new capture for the operation."""
+    operation = re.sub(r"[^\w-]", "_", operation_name or "anonymous")[:64]
+    return os.path.join(
+        settings.GRAPHQL_PROFILING["DIRECTORY"],
+        f"{operation}.{time.strftime('%Y%m%d-%H%M%S')}.{os.getpid()}.{random.randrange(16 ** 6):06x}",
+    )
+
+
+@contextmanager
+def profiled(operation_name):
+    """Profiles the wrapped block and stores `<path>.prof` and `<path>.txt` captures."""
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        os.makedirs(settings.GRAPHQL_PROFILING["DIRECTORY"], exist_ok=True)
+        path = profile_path(operation_name)
+        profiler.dump_stats(f"{path}.prof")
+        with open(f"{path}.txt", "w") as summary:
+            summary.write(summarize(pstats.Stats(profiler)))
+
+
+def summarize(stats, limit=None):
+    """Returns the top-N functions of the stats by cumulative time."""
+    output = io.StringIO()
+    stats.stream = output
+    stats.sort_stats("cumulative").print_stats(limit or settings.GRAPHQL_PROFILING["TOP"])
+    return output.getvalue()
+
+
+def list_profiles(operation_name=None):
+    """Returns (operation, path) of the stored pstats captures, oldest first."""
+    directory = settings.GRAPHQL_PROFILING["DIRECTORY"]
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for file_name in sorted(os.listdir(directory), key=lambda name: name.split(".")[1:]):
+        if not file_name.endswith(".prof"):
+            continue
+        operation = file_name.split(".", 1)[0]
+        if operation_name is None or operation == operation_name:
+            profiles.append((operation, os.path.join(directory, file_name)))
+    return profiles
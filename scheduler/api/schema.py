@@ -1,12 +1,14 @@
+from functools import lru_cache
+
 import graphene
-from graphql_auth.schema import UserQuery
 
 from scheduler.meeting_scheduler.schema import (
-    AvailabilityQuery, BookingQuery, AvailabilityMutation, BookingMutation, UserMutation
+    AvailabilityQuery, BookingQuery, AvailabilityMutation, BookingMutation, UserMutation, UserQuery,
+    UtilizationQuery,
 )
 
 
-class Query(BookingQuery, AvailabilityQuery, UserQuery):
+class Query(BookingQuery, AvailabilityQuery, UtilizationQuery, UserQuery):
     pass
 
 
@@ -14,4 +16,14 @@ class Mutation(AvailabilityMutation, BookingMutation, UserMutation):
     pass
 
 
-schema = graphene.Schema(query=Query, mutation=Mutation)
+@lru_cache(maxsize=None)
+def get_schema():
+    """Build the API schema once, on first use."""
+    return graphene.Schema(query=Query, mutation=Mutation)
+
+
+def __getattr__(name):
+    """Keep `schema` importable while deferring its construction until it is accessed."""
+    if name == "schema":
+        return get_schema()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
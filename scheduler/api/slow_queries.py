@@ -0,0 +1,157 @@
+"""
+Slow-query log for database queries issued while executing GraphQL operations.
+
+Queries slower than `SLOW_QUERY_LOG["THRESHOLD_MS"]` are logged together with
+the operation and resolver path that issued them, their query plan and a
+fingerprint of the normalized SQL. Records are appended as JSON lines to
+`SLOW_QUERY_LOG["FILE"]` and aggregated by `python manage.py slow_queries`.
+"""
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connection as default_connection
+
+from .profiling import get_operation_name
+
+log = logging.getLogger(__name__)
+
+current_operation = ContextVar("current_operation", default=None)
+current_resolver = ContextVar("current_resolver", default=None)
+
+_write_lock = threading.Lock()
+_explaining = threading.local()
+
+
+def normalize_sql(sql):
+    """Returns the SQL with literals and IN lists collapsed, whitespace squashed."""
+    sql = re.sub(r"'(?:[^']|'')*'", "?", sql)
+    sql = re.sub(r"\b\d+(?:\.\d+)?\b", "?", sql)
+    sql = sql.replace("%s", "?")
+    sql = re.sub(r"\(\s*\?(?:\s*,\s*\?)*\s*\)", "(...)", sql)
+    return re.sub(r"\s+", " ", sql).strip()
+
+
+def fingerprint(sql):
+    """Returns a short stable identifier of the normalized SQL."""
+    return hashlib.sha1(normalize_sql(sql).encode()).hexdigest()[:12]
+
+
+def explain(connection, sql, params):
+    """Returns the query plan of the SELECT statement as a list of rows."""
+    if not sql.lstrip().upper().startswith("SELECT"):
+        return None
+    prefix = "EXPLAIN QUERY PLAN" if connection.vendor == "sqlite" else "EXPLAIN"
+    _explaining.active = True
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f"{prefix} {sql}", params)
+            return [" ".join(str(column) for column in row) for row in cursor.fetchall()]
+    except Exception as error:  # pylint: disable=broad-except
+        return [f"EXPLAIN failed: {error}"]
+    finally:
+        _explaining.active = False
+
+
+class SlowQueryLogger:
+    """
+    Database execute wrapper logging slow queries, install it with `connection.execute_wrapper`.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __call__(self, execute, sql, params, many, context):
+        if getattr(_explaining, "active", False):
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            if duration_ms >= settings.SLOW_QUERY_LOG["THRESHOLD_MS"]:
+                self.record(sql, params, many, duration_ms)
+
+    @staticmethod
+    def operation_name():
+        """Returns the name of the operation being executed, parsing its query only when needed."""
+        operation = current_operation.get()
+        if operation is None:
+            return None
+        operation_name, query = operation
+        return operation_name or get_operation_name(query)
+
+    def record(self, sql, params, many, duration_ms):
+        """Logs the slow query and appends it to the slow-query file."""
+        record = {
+            "fingerprint": fingerprint(sql),
+            "sql": sql,
+            "duration_ms": round(duration_ms, 3),
+            "operation": self.operation_name(),
+            "resolver": current_resolver.get(),
+            "plan": None if many or not settings.SLOW_QUERY_LOG["EXPLAIN"] else explain(
+                self.connection, sql, params
+            ),
+        }
+        log.warning(
+            "Slow query %s (%.1f ms) in %s/%s: %s",
+            record["fingerprint"], duration_ms, record["operation"], record["resolver"], sql,
+        )
+        if settings.SLOW_QUERY_LOG["FILE"]:
+            with _write_lock, open(settings.SLOW_QUERY_LOG["FILE"], "a") as log_file:
+                log_file.write(json.dumps(record) + "\n")
+
+
+@contextmanager
+def slow_query_log(operation_name, query):
+    """Logs slow queries of the default database issued by the wrapped operation."""
+    token = current_operation.set((operation_name, query))
+    try:
+        with default_connection.execute_wrapper(SlowQueryLogger(default_connection)):
+            yield
+    finally:
+        current_operation.reset(token)
+
+
+class ResolverTrackingMiddleware:
+    """Graphene middleware remembering the path of the resolver being executed."""
+
+    def resolve(self, next, root, info, **kwargs):
+        token = current_resolver.set(".".join(str(key) for key in info.path))
+        try:
+            return next(root, info, **kwargs)
+        finally:
+            current_resolver.reset(token)
+
+
+def aggregate(records):
+    """
+    Aggregates slow-query records by fingerprint.
+    Returns:
+        list: one dict per fingerprint, slowest total time first.
+    """
+    groups = defaultdict(lambda: {
+        "count": 0, "total_ms": 0.0, "max_ms": 0.0, "operations": set(), "resolvers": set(),
+    })
+    for record in records:
+        group = groups[record["fingerprint"]]
+        group["count"] += 1
+        group["total_ms"] += record["duration_ms"]
+        if record["duration_ms"] >= group["max_ms"]:
+            group.update(max_ms=record["duration_ms"], sql=normalize_sql(record["sql"]), plan=record["plan"])
+        group["operations"].add(record["operation"] or "-")
+        group["resolvers"].add(record["resolver"] or "-")
+
+    return sorted(
+        ({"fingerprint": key, **group} for key, group in groups.items()),
+        key=lambda group: group["total_ms"],
+        reverse=True,
+    )
@@ -1,15 +1,74 @@
 """
 Booking graphql api tests
 """
-from datetime import time
+import json
+import os
+import tempfile
+from datetime import date, datetime, time, timedelta
+from io import StringIO
+from time import perf_counter
+from unittest import mock
 
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from graphene_django.settings import graphene_settings
+from graphql import print_schema
 from graphql_relay import to_global_id
 
+from scheduler.meeting_scheduler import metrics
+from scheduler.meeting_scheduler.filters import BookingFilter
+from scheduler.meeting_scheduler.loaders import load_upcoming_bookings
+from scheduler.meeting_scheduler.management.commands.benchmark_encoding import bookings_response
+from scheduler.meeting_scheduler.management.commands.profile_startup import profile_startup
+from scheduler.meeting_scheduler.models import (
+    Availability, BackgroundTask, Booking, DailyUtilization, IdempotencyKey, SlotHold, UserModel,
+)
+from scheduler.meeting_scheduler.mutations import UpdateAvailability
 from scheduler.meeting_scheduler.tests import BaseTests
-from .schema import schema
+from .encoding import encode, iter_encode
+from .profiling import make_token
+from .schema import get_schema, schema
+from .slow_queries import fingerprint, normalize_sql
+from .views import read_printed_schema
 
 
-class BookingAPITests(BaseTests):
+class BaseAPITests(BaseTests):
+    """
+    Base class for graphql api tests.
+    """
+
+    @classmethod
+    def execute_and_assert_success(cls, query, **kwargs):
+        """
+        Run the query and assert there were no errors.
+        """
+        result = schema.execute(query, **kwargs)
+
+        assert result.errors is None, result.errors
+        return result.data
+
+    @classmethod
+    def execute_and_assert_error(cls, query, error, **kwargs):
+        """
+        Run the query and assert there the expected error is raised.
+        """
+        result = schema.execute(query, **kwargs)
+        assert result.errors is not None, "No errors while executing query!"
+        assert any(
+            [error in err.message for err in result.errors]
+        ) is True, f'No error {error} instead {result.errors}'
+        return result.errors
+
+
+class BookingAPITests(BaseAPITests):
     """
     Booking api tests.
     """
@@ -38,28 +97,6 @@ class BookingAPITests(BaseTests):
             }
         '''
 
-    @classmethod
-    def execute_and_assert_success(cls, query, **kwargs):
-        """
-        Run the query and assert there were no errors.
-        """
-        result = schema.execute(query, **kwargs)
-
-        assert result.errors is None, result.errors
-        return result.data
-
-    @classmethod
-    def execute_and_assert_error(cls, query, error, **kwargs):
-        """
-        Run the query and assert there the expected error is raised.
-        """
-        result = schema.execute(query, **kwargs)
-        assert result.errors is not None, "No errors while executing query!"
-        assert any(
-            [error in err.message for err in result.errors]
-        ) is True, f'No error {error} instead {result.errors}'
-        return result.errors
-
     def test_user_has_one_booking(self):
         """Test that get user booking api returns data."""
         data = self.execute_and_assert_success(
@@ -135,3 +172,858 @@ class BookingAPITests(BaseTests):
         """
         expected_error = 'Variable "$username" of required type "String!" was not provided.'
         self.execute_and_assert_error(self.booking_by_user_query, error=expected_error)
+
+    def test_hold_slot(self):
+        """Test that a held slot can only be booked with its hold token."""
+        hold_mutation = '''
+            mutation { holdSlot(username: "api-user", targetDate: "%s", targetTime: "11:30", totalTime: 15) {
+              success hold { token expiresAt }
+            } }
+        ''' % date.today().isoformat()
+        booking_mutation = '''
+            mutation createBooking($holdToken: UUID) {
+              createBooking(
+                username: "api-user", fullName: "Demo", email: "a@a.com",
+                targetDate: "%s", targetTime: "11:30", totalTime: 15, holdToken: $holdToken
+              ) { success }
+            }
+        ''' % date.today().isoformat()
+        hold = self.execute_and_assert_success(hold_mutation)['holdSlot']['hold']
+
+        self.execute_and_assert_error(hold_mutation, error='has this slot on hold')
+        self.execute_and_assert_error(booking_mutation, error='has this slot on hold')
+        data = self.execute_and_assert_success(booking_mutation, variables={"holdToken": hold['token']})
+        assert data['createBooking']['success'] is True
+        assert BackgroundTask.objects.filter(name__endswith='send_booking_confirmation').count() == 1
+
+    def test_hold_token_of_another_slot(self):
+        """Test that a hold token cannot book, nor release, a slot it does not cover."""
+        hold = self.execute_and_assert_success('''
+            mutation { holdSlot(username: "api-user", targetDate: "%s", targetTime: "11:30", totalTime: 15) {
+              hold { token }
+            } }
+        ''' % date.today().isoformat())['holdSlot']['hold']
+        booking_mutation = '''
+            mutation createBooking($holdToken: UUID) {
+              createBooking(
+                username: "api-user", fullName: "Demo", email: "a@a.com",
+                targetDate: "%s", targetTime: "11:20", totalTime: 5, holdToken: $holdToken
+              ) { success }
+            }
+        ''' % date.today().isoformat()
+
+        self.execute_and_assert_error(
+            booking_mutation, error='does not cover this slot', variables={"holdToken": hold['token']}
+        )
+        assert SlotHold.objects.filter(token=hold['token']).exists()
+
+    def test_hold_tokens_not_readable_through_users(self):
+        """Test that hold tokens & daily utilization cannot be read through user nodes."""
+        self.execute_and_assert_success('''
+            mutation { holdSlot(username: "api-user", targetDate: "%s", targetTime: "11:30", totalTime: 15) {
+              success
+            } }
+        ''' % date.today().isoformat())
+
+        for field in ('userSlotHolds { token }', 'userDailyUtilization { date }'):
+            self.execute_and_assert_error(
+                'query { users { edges { node { username %s } } } }' % field, error='Cannot query field'
+            )
+
+    def test_nested_user_selection_query_count(self):
+        """Test that selecting booking users does not issue a query per booking."""
+        for hour in (12, 13, 14):
+            self.create_availability(
+                self.user,
+                from_time=datetime.combine(date.today(), time(hour=hour)),
+                to_time=datetime.combine(date.today(), time(hour=hour, minute=45)),
+            )
+            self.create_booking(self.user, start_time=time(hour=hour), total_time=15)
+
+        # One count query for the connection and one select for the page.
+        with self.assertNumQueries(2):
+            bookings = self.execute_and_assert_success(
+                self.booking_by_user_query,
+                variables={"username": "api-user"}
+            )['bookings']['edges']
+        assert len(bookings) == 4
+        assert all(edge['node']['user']['username'] == 'api-user' for edge in bookings)
+
+    def test_narrow_selection_loads_narrow_columns(self):
+        """Test that only the selected booking columns are loaded."""
+        query = '''
+            query getUserBookings($username: String!) {
+              bookings(username: $username) { edges { node { ...BookingFields } } }
+            }
+            fragment BookingFields on BookingType { id startTime }
+        '''
+        with CaptureQueriesContext(connection) as context:
+            bookings = self.execute_and_assert_success(
+                query,
+                variables={"username": "api-user"}
+            )['bookings']['edges']
+
+        select = context.captured_queries[-1]['sql']
+        assert '"start_time"' in select
+        assert '"full_name"' not in select
+        assert bookings[0]['node']['startTime'] == '11:00:00'
+
+    def test_availabilities_selection(self):
+        """Test that user availabilities resolve with their users in constant queries."""
+        request = RequestFactory().post('/api/graphql')
+        request.user = self.user
+        query = '''
+            query {
+              availabilities { edges { node { id intervalMints user { username } } } }
+            }
+        '''
+        with self.assertNumQueries(2):
+            availabilities = self.execute_and_assert_success(query, context_value=request)['availabilities']['edges']
+
+        assert availabilities[0]['node']['intervalMints'] == 'Fifteen (15) mints'
+        assert availabilities[0]['node']['user'] == {'username': 'api-user'}
+
+    def test_utilization(self):
+        """Test that utilization returns the caller's daily summary in the date range."""
+        query = '''
+            query utilization($from: Date!, $to: Date!) {
+              utilization(username: "api-user", dateFrom: $from, dateTo: $to) {
+                date bookedMinutes availableMinutes utilization
+              }
+            }
+        '''
+        today = date.today()
+        variables = {"from": today.isoformat(), "to": (today + timedelta(days=7)).isoformat()}
+        request = RequestFactory().post('/api/graphql')
+        request.user = self.user
+        data = self.execute_and_assert_success(query, variables=variables, context_value=request)
+        assert data['utilization'] == [{
+            'date': today.isoformat(), 'bookedMinutes': 15, 'availableMinutes': 45, 'utilization': 1 / 3,
+        }]
+
+        request.user = self.create_user(username="other-user")
+        data = self.execute_and_assert_success(query, variables=variables, context_value=request)
+        assert data['utilization'] == []
+        request.user = AnonymousUser()
+        self.execute_and_assert_error(
+            query, error='You do not have permission', variables=variables, context_value=request
+        )
+
+    def test_idempotent_create_booking(self):
+        """Test that a retried booking returns the original booking without validating it again."""
+        mutation = '''
+            mutation createBooking($time: Time!, $key: String) {
+              createBooking(
+                username: "api-user", fullName: "Demo", email: "a@a.com",
+                targetDate: "%s", targetTime: $time, totalTime: 15, idempotencyKey: $key
+              ) { success booking { id fullName startTime } }
+            }
+        ''' % date.today().isoformat()
+        variables = {"time": "11:30", "key": "retry-1"}
+        original = self.execute_and_assert_success(mutation, variables=variables)['createBooking']
+
+        # Only the stored response is read.
+        with self.assertNumQueries(1):
+            retried = self.execute_and_assert_success(mutation, variables=variables)['createBooking']
+        assert retried == original
+        assert Booking.objects.filter(user=self.user).count() == 2
+
+        self.execute_and_assert_error(
+            mutation, error='already been used with different arguments', variables={"time": "11:20", "key": "retry-1"}
+        )
+        IdempotencyKey.objects.update(expires_at=datetime.now())
+        self.execute_and_assert_error(mutation, error='overlapping with other bookings', variables=variables)
+
+    def test_idempotency_keys_scoped_to_caller(self):
+        """Test that a key used by another caller does not replay the first caller's booking."""
+        mutation = '''
+            mutation createBooking($time: Time!) {
+              createBooking(
+                username: "api-user", fullName: "Demo", email: "a@a.com",
+                targetDate: "%s", targetTime: $time, totalTime: 15, idempotencyKey: "shared"
+              ) { success booking { id } }
+            }
+        ''' % date.today().isoformat()
+        request = RequestFactory().post('/api/graphql')
+        request.user = self.create_user(username="first-caller")
+        first = self.execute_and_assert_success(mutation, variables={"time": "11:30"}, context_value=request)
+
+        self.create_availability(
+            self.user,
+            from_time=datetime.combine(date.today(), time(hour=12)),
+            to_time=datetime.combine(date.today(), time(hour=13)),
+        )
+        request.user = self.create_user(username="second-caller")
+        second = self.execute_and_assert_success(mutation, variables={"time": "12:00"}, context_value=request)
+        assert second['createBooking']['booking'] != first['createBooking']['booking']
+        # Anonymous callers have their own scope too.
+        self.execute_and_assert_error(mutation, error='overlapping with other bookings', variables={"time": "12:00"})
+
+        IdempotencyKey.objects.filter(user__username="first-caller").update(expires_at=datetime.now())
+        out = StringIO()
+        call_command('purge_idempotency_keys', stdout=out)
+        assert out.getvalue().strip() == 'Deleted 1 expired idempotency keys.'
+        assert IdempotencyKey.objects.count() == 1
+
+    def test_concurrent_idempotent_create_booking(self):
+        """Test that a retry storing the key between the lookup and the save gets the original booking."""
+        mutation = '''
+            mutation { createBooking(
+              username: "api-user", fullName: "Demo", email: "a@a.com",
+              targetDate: "%s", targetTime: "11:30", totalTime: 15, idempotencyKey: "concurrent"
+            ) { success booking { id } } }
+        ''' % date.today().isoformat()
+        arguments = {
+            "username": "api-user", "target_date": date.today(), "target_time": time(hour=11, minute=30),
+            "full_name": "Demo", "email": "a@a.com", "total_time": 15,
+        }
+        # The retry commits its key after this request looked it up.
+        IdempotencyKey.store('CreateBooking', 'concurrent', arguments, self.user_booking)
+        stored = IdempotencyKey.lookup('CreateBooking', 'concurrent', arguments)
+        with mock.patch.object(IdempotencyKey, 'lookup', side_effect=[None, stored]):
+            data = self.execute_and_assert_success(mutation)['createBooking']
+
+        assert data == {'success': True, 'booking': {'id': to_global_id('BookingType', self.user_booking.pk)}}
+        assert Booking.objects.filter(user=self.user).count() == 1
+        assert not BackgroundTask.objects.exists()
+
+    def test_booking_validated_under_host_lock(self):
+        """Test that the booking is validated & saved in one transaction holding the host's lock."""
+        mutation = '''
+            mutation { createBooking(
+              username: "api-user", fullName: "Demo", email: "a@a.com",
+              targetDate: "%s", targetTime: "11:30", totalTime: 15
+            ) { success } }
+        ''' % date.today().isoformat()
+        calls = mock.Mock()
+        is_valid_new_booking = Booking.is_valid_new_booking
+
+        def validate(booking, **kwargs):
+            calls.validate(len(connection.savepoint_ids))
+            return is_valid_new_booking(booking, **kwargs)
+
+        savepoints = len(connection.savepoint_ids)
+        with mock.patch('scheduler.meeting_scheduler.mutations.lock_user', calls.lock), \
+                mock.patch.object(Booking, 'is_valid_new_booking', validate):
+            self.execute_and_assert_success(mutation)
+
+        assert calls.mock_calls == [mock.call.lock(self.user), mock.call.validate(savepoints + 1)]
+
+    def test_rolled_back_booking_leaves_no_task(self):
+        """Test that the confirmation task is only stored along with its booking."""
+        mutation = '''
+            mutation { createBooking(
+              username: "api-user", fullName: "Demo", email: "a@a.com",
+              targetDate: "%s", targetTime: "11:30", totalTime: 15, idempotencyKey: "rolled-back"
+            ) { success } }
+        ''' % date.today().isoformat()
+        with mock.patch.object(IdempotencyKey, 'store', side_effect=RuntimeError('boom')):
+            self.execute_and_assert_error(mutation, error='boom')
+
+        assert Booking.objects.filter(user=self.user).count() == 1
+        assert not BackgroundTask.objects.exists()
+
+    def test_free_slots(self):
+        """Test that free slots intersect the hosts' availabilities, bookings & holds."""
+        other = self.create_user(username="api-user2")
+        today = date.today()
+        self.create_availability(
+            other,
+            from_time=datetime.combine(today, time(hour=11)),
+            to_time=datetime.combine(today, time(hour=12)),
+        )
+        query = '''
+            query freeSlots($usernames: [String!]!) {
+              freeSlots(usernames: $usernames, date: "%s", totalTime: 15)
+            }
+        ''' % today.isoformat()
+
+        data = self.execute_and_assert_success(query, variables={"usernames": ["api-user2"]})
+        assert data['freeSlots'] == ['11:00:00', '11:15:00', '11:30:00', '11:45:00']
+        data = self.execute_and_assert_success(query, variables={"usernames": ["api-user", "api-user2"]})
+        assert data['freeSlots'] == ['11:30:00']
+        data = self.execute_and_assert_success(query, variables={"usernames": ["api-user", "unknown"]})
+        assert data['freeSlots'] == []
+
+        SlotHold.objects.create(
+            user=other, date=today, start_time=time(hour=11, minute=30), end_time=time(hour=11, minute=40),
+            expires_at=datetime.now() + timedelta(minutes=2),
+        )
+        data = self.execute_and_assert_success(query, variables={"usernames": ["api-user", "api-user2"]})
+        assert data['freeSlots'] == []
+
+    def test_upsert_availabilities(self):
+        """Test that availabilities are created, updated & coalesced in one mutation."""
+        request = RequestFactory().post('/api/graphql')
+        request.user = self.user
+        today, tomorrow = date.today(), date.today() + timedelta(days=1)
+        mutation = '''
+            mutation upsert($availabilities: [AvailabilityInput!]!) {
+              upsertAvailabilities(availabilities: $availabilities) {
+                success availabilities { id fromTime toTime }
+              }
+            }
+        '''
+        availabilities = [
+            {"id": to_global_id('AvailabilityType', self.availability.pk), "availabilityTo": f'{today}T12:00:00'},
+            {"availabilityFrom": f'{tomorrow}T09:00:00', "availabilityTo": f'{tomorrow}T10:00:00',
+             "timeIntervalMints": 15},
+            {"availabilityFrom": f'{tomorrow}T10:00:00', "availabilityTo": f'{tomorrow}T11:00:00',
+             "timeIntervalMints": 15},
+        ]
+        with CaptureQueriesContext(connection) as context:
+            data = self.execute_and_assert_success(
+                mutation, variables={"availabilities": availabilities}, context_value=request
+            )['upsertAvailabilities']
+
+        assert [(item['fromTime'], item['toTime']) for item in data['availabilities']] == [
+            (f'{today}T11:00:00', f'{today}T12:00:00'), (f'{tomorrow}T09:00:00', f'{tomorrow}T11:00:00'),
+        ]
+        assert all(item['id'] for item in data['availabilities'])
+        update = next(query['sql'] for query in context.captured_queries if query['sql'].startswith('UPDATE'))
+        assert '"to_time"' in update and '"from_time"' not in update
+        assert DailyUtilization.objects.get(user=self.user, date=tomorrow).available_minutes == 120
+
+        other = self.create_user(username="api-user2")
+        foreign = self.create_availability(other)
+        availabilities = [
+            {"id": to_global_id('AvailabilityType', foreign.pk), "availabilityTo": f'{today}T13:00:00'},
+            {"availabilityFrom": f'{today}T15:00:00', "availabilityTo": f'{today}T16:00:00', "timeIntervalMints": 15},
+        ]
+        self.execute_and_assert_error(
+            mutation, "seem to be belong you", variables={"availabilities": availabilities},
+            context_value=request,
+        )
+        assert Availability.objects.filter(user=self.user).count() == 2
+
+    def test_upsert_availabilities_errors(self):
+        """Test that unknown & malformed IDs are reported as given and empty windows are rejected."""
+        request = RequestFactory().post('/api/graphql')
+        request.user = self.user
+        mutation = '''
+            mutation upsert($availabilities: [AvailabilityInput!]!) {
+              upsertAvailabilities(availabilities: $availabilities) { success }
+            }
+        '''
+        today = date.today()
+        ids = [to_global_id('AvailabilityType', pk) for pk in (f'0{self.availability.pk + 1}', 'abc')]
+        self.execute_and_assert_error(
+            mutation, f"These IDs:{', '.join(ids)} don't seem to be belong you!",
+            variables={"availabilities": [{"id": id, "availabilityTo": f'{today}T13:00:00'} for id in ids]},
+            context_value=request,
+        )
+
+        non_canonical_id = to_global_id('AvailabilityType', f'0{self.availability.pk}')
+        availabilities = [{"id": non_canonical_id, "availabilityTo": f'{today}T10:00:00'}]
+        self.execute_and_assert_error(
+            mutation, "must start before it ends", variables={"availabilities": availabilities},
+            context_value=request,
+        )
+        self.availability.refresh_from_db()
+        assert self.availability.to_time.hour == 11
+
+    def test_delete_availabilities(self):
+        """Test that availabilities are deleted together, only when all belong to the user."""
+        request = RequestFactory().post('/api/graphql')
+        request.user = self.user
+        mutation = '''
+            mutation delete($ids: [String!]!) { deleteAvailabilities(ids: $ids) { success } }
+        '''
+        foreign = self.create_availability(self.create_user(username="api-user2"))
+        ids = [to_global_id('AvailabilityType', pk) for pk in (self.availability.pk, foreign.pk)]
+        self.execute_and_assert_error(
+            mutation, "seem to be belong you", variables={"ids": ids}, context_value=request
+        )
+        assert Availability.objects.count() == 2
+
+        data = self.execute_and_assert_success(mutation, variables={"ids": ids[:1]}, context_value=request)
+        assert data['deleteAvailabilities']['success'] is True
+        assert list(Availability.objects.all()) == [foreign]
+        assert DailyUtilization.objects.get(user=self.user, date=date.today()).available_minutes == 0
+
+    def test_update_availability_saves_changed_fields(self):
+        """Test that updating an availability only writes the changed columns."""
+        with CaptureQueriesContext(connection) as context:
+            UpdateAvailability.perform_update(
+                Availability.objects.get(pk=self.availability.pk),
+                availability_to=datetime.combine(date.today(), time(hour=12)),
+            )
+        update = next(query['sql'] for query in context.captured_queries if query['sql'].startswith('UPDATE'))
+        assert '"to_time"' in update and '"interval_mints"' not in update
+
+
+class BatchedRequestTests(BaseTests):
+    """
+    Batched graphql endpoint tests.
+    """
+    url = '/api/graphql'
+
+    def setUp(self) -> None:
+        self.user = self.create_user(username="batch-user")
+        self.availability = self.create_availability(self.user)
+        self.create_booking(self.user, start_time=time(hour=11, minute=0, second=0), total_time=15)
+        self.query = '''
+            query getUserBookings($username: String!) {
+              bookings(username: $username){ edges { node { id } } }
+            }
+        '''
+
+    def post(self, body):
+        return self.client.post(self.url, json.dumps(body), content_type='application/json')
+
+    def test_single_operation(self):
+        """Test that a single operation still returns a single result object."""
+        response = self.post({"query": self.query, "variables": {"username": "batch-user"}})
+
+        assert response.status_code == 200
+        assert len(response.json()['data']['bookings']['edges']) == 1
+
+    def test_batched_operations(self):
+        """Test that a list of operations returns a list of results in order."""
+        response = self.post([
+            {"id": "first", "query": self.query, "variables": {"username": "batch-user"}},
+            {"id": "second", "query": self.query, "variables": {"username": "unknown"}},
+        ])
+
+        assert response.status_code == 200
+        first, second = response.json()
+        assert first['id'] == 'first'
+        assert len(first['data']['bookings']['edges']) == 1
+        assert second['id'] == 'second'
+        assert second['data']['bookings']['edges'] == []
+
+    def test_batch_size_limit(self):
+        """Test that batches larger than the configured limit are rejected."""
+        with self.settings(GRAPHQL_BATCH_MAX_OPERATIONS=1):
+            response = self.post([{"query": self.query}, {"query": self.query}])
+
+        assert response.status_code == 400
+        assert 'limited to 1 operations' in response.json()['errors'][0]['message']
+
+
+class StartupTests(BaseTests):
+    """
+    Schema construction and worker startup tests.
+    """
+
+    def test_printed_schema_is_up_to_date(self):
+        """Test that the printed schema artifact matches the schema, run `manage.py graphql_schema` if not."""
+        with open(graphene_settings.SCHEMA_OUTPUT) as schema_file:
+            assert schema_file.read() == print_schema(get_schema())
+
+    def test_printed_schema_endpoint(self):
+        """Test that the printed schema is served from the artifact."""
+        response = self.client.get('/api/schema.graphql')
+
+        assert response.status_code == 200
+        assert response.content.decode() == read_printed_schema()
+
+    def test_startup_time(self):
+        """Test that a cold worker start and the lazy schema build stay within budget."""
+        timings, modules = profile_startup()
+
+        assert timings['setup'] < 5, timings
+        assert timings['schema'] < 1, timings
+        assert any(module == 'scheduler.api.schema' for module, _, _ in modules)
+
+
+class ProfilingTests(BaseTests):
+    """
+    On-demand operation profiling tests.
+    """
+    url = '/api/graphql'
+    query = 'query userBookings { bookings(username: "nobody") { edges { node { id } } } }'
+
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def post(self, sample_rate=0.0, **headers):
+        profiling = {**settings.GRAPHQL_PROFILING, 'DIRECTORY': self.directory, 'SAMPLE_RATE': sample_rate}
+        with self.settings(GRAPHQL_PROFILING=profiling):
+            response = self.client.post(
+                self.url, json.dumps({"query": self.query}), content_type='application/json', **headers
+            )
+            assert response.status_code == 200
+            return sorted(os.listdir(self.directory))
+
+    def test_not_profiled_by_default(self):
+        """Test that operations are not profiled without header or sampling."""
+        assert self.post() == []
+        assert self.post(HTTP_X_GRAPHQL_PROFILE='forged') == []
+
+    def test_signed_header(self):
+        """Test that a signed header stores the pstats file and summary keyed by operation."""
+        files = self.post(HTTP_X_GRAPHQL_PROFILE=make_token())
+
+        assert [name.split('.', 1)[0] for name in files] == ['userBookings', 'userBookings']
+        assert {name.rsplit('.', 1)[1] for name in files} == {'prof', 'txt'}
+
+    def test_sampled_and_aggregated(self):
+        """Test that sampled operations are captured and aggregated by the command."""
+        self.post(sample_rate=1.0)
+        self.post(sample_rate=1.0)
+
+        out = StringIO()
+        with self.settings(GRAPHQL_PROFILING={**settings.GRAPHQL_PROFILING, 'DIRECTORY': self.directory}):
+            call_command('graphql_profiles', operation='userBookings', aggregate=True, limit=5, stdout=out)
+        assert 'Aggregated 2 profiles.' in out.getvalue()
+        assert 'cumulative' in out.getvalue()
+
+
+class SlowQueryLogTests(BaseTests):
+    """
+    Slow-query log tests.
+    """
+    url = '/api/graphql'
+    query = 'query userBookings { bookings(username: "nobody") { edges { node { id } } } }'
+
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.log_file = os.path.join(directory.name, 'slow_queries.log')
+
+    def slow_query_log(self, **overrides):
+        return self.settings(SLOW_QUERY_LOG={
+            **settings.SLOW_QUERY_LOG, 'ENABLED': True, 'THRESHOLD_MS': 0, 'FILE': self.log_file, **overrides
+        })
+
+    def test_normalize_sql(self):
+        """Test that literals and IN lists do not change the fingerprint."""
+        assert normalize_sql("SELECT * FROM t WHERE id IN (%s, %s) AND x = 'a'  LIMIT 21") == \
+            'SELECT * FROM t WHERE id IN (...) AND x = ? LIMIT ?'
+        assert fingerprint('SELECT 1 WHERE id IN (%s)') == fingerprint('SELECT 2 WHERE id IN (%s, %s)')
+
+    def test_slow_queries_logged_with_operation_and_plan(self):
+        """Test that slow queries are logged with their operation, resolver and query plan."""
+        with self.slow_query_log():
+            self.client.post(self.url, json.dumps({"query": self.query}), content_type='application/json')
+
+        with open(self.log_file) as log_file:
+            records = [json.loads(line) for line in log_file]
+        assert records
+        assert {record['operation'] for record in records} == {'userBookings'}
+        assert {record['resolver'] for record in records} == {'bookings'}
+        assert all(record['plan'] for record in records)
+
+        out = StringIO()
+        with self.slow_query_log():
+            call_command('slow_queries', stdout=out)
+        assert f"{records[0]['fingerprint']}  count=" in out.getvalue()
+        assert 'plan: ' in out.getvalue()
+
+    def test_disabled(self):
+        """Test that nothing is logged when the slow-query log is disabled."""
+        with self.slow_query_log(ENABLED=False):
+            self.client.post(self.url, json.dumps({"query": self.query}), content_type='application/json')
+        assert not os.path.exists(self.log_file)
+
+
+class RangeFilterTests(BaseAPITests):
+    """
+    Date-range & time-window filter tests on a large seeded table.
+    """
+    week_query = '''
+        query weekBookings($username: String!, $from: Date!, $to: Date!, $after: Time, $before: Time) {
+          bookings(username: $username, dateFrom: $from, dateTo: $to, startsAfter: $after, endsBefore: $before) {
+            edges { node { id date startTime } }
+          }
+        }
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [UserModel.objects.create(username=f'host-{index}') for index in range(20)]
+        cls.first_date = date(2022, 1, 3)
+        # 20 users x 365 days x 2 bookings at 09:00 & 14:00.
+        Booking.objects.bulk_create(
+            Booking(
+                user=user, full_name='Demo', email='a@a.com',
+                date=cls.first_date + timedelta(days=day), start_time=time(hour=hour),
+                end_time=time(hour=hour, minute=30), total_time=30,
+            )
+            for user in cls.users for day in range(365) for hour in (9, 14)
+        )
+
+    def week_variables(self, **extra):
+        return {
+            "username": "host-7",
+            "from": self.first_date.isoformat(),
+            "to": (self.first_date + timedelta(days=6)).isoformat(),
+            **extra,
+        }
+
+    def test_week_view(self):
+        """Test that a week view returns only that week's bookings in constant queries."""
+        started = perf_counter()
+        with self.assertNumQueries(2):
+            edges = self.execute_and_assert_success(
+                self.week_query, variables=self.week_variables()
+            )['bookings']['edges']
+        assert perf_counter() - started < 1
+
+        dates = {edge['node']['date'] for edge in edges}
+        assert len(edges) == 14
+        assert min(dates) == '2022-01-03' and max(dates) == '2022-01-09'
+
+    def test_time_window(self):
+        """Test that startsAfter & endsBefore restrict the bookings to the time window."""
+        edges = self.execute_and_assert_success(
+            self.week_query, variables=self.week_variables(after="12:00", before="18:00")
+        )['bookings']['edges']
+
+        assert len(edges) == 7
+        assert {edge['node']['startTime'] for edge in edges} == {'14:00:00'}
+
+    def test_week_view_uses_index(self):
+        """Test that the week view query built by the GraphQL filter is served by the (user, date, start_time) index."""
+        variables = self.week_variables()
+        filterset = BookingFilter(
+            data={"username": variables["username"], "date_from": variables["from"], "date_to": variables["to"]},
+            queryset=Booking.objects.all(),
+        )
+        plan = filterset.qs.explain()
+        assert 'SCAN meeting_scheduler_booking' not in plan, plan
+        assert 'USING INDEX meeting_sch_user_id_b52a84_idx' in plan, plan
+
+    def test_availability_filters(self):
+        """Test that availabilities can be filtered by date range and time window."""
+        request = RequestFactory().post('/api/graphql')
+        request.user = self.users[0]
+        for day in range(3):
+            self.create_availability(
+                self.users[0],
+                from_time=datetime.combine(self.first_date + timedelta(days=day), time(hour=9)),
+                to_time=datetime.combine(self.first_date + timedelta(days=day), time(hour=12)),
+            )
+        query = '''
+            query availabilities($from: Date, $to: Date, $after: DateTime) {
+              availabilities(dateFrom: $from, dateTo: $to, startsAfter: $after) { edges { node { fromTime } } }
+            }
+        '''
+        second_day = (self.first_date + timedelta(days=1)).isoformat()
+
+        edges = self.execute_and_assert_success(
+            query, variables={"from": second_day, "to": second_day}, context_value=request
+        )['availabilities']['edges']
+        assert [edge['node']['fromTime'] for edge in edges] == [f'{second_day}T09:00:00']
+
+        edges = self.execute_and_assert_success(
+            query, variables={"after": f'{second_day}T00:00:00'}, context_value=request
+        )['availabilities']['edges']
+        assert len(edges) == 2
+
+
+class ResponseEncodingTests(BaseTests):
+    """
+    Lean and streamed response encoding tests.
+    """
+    url = '/api/graphql'
+    query = '{ bookings { edges { node { id fullName date startTime } } } }'
+
+    def setUp(self) -> None:
+        self.user = self.create_user(username="encoding-user")
+        self.create_availability(self.user)
+        self.create_booking(self.user, start_time=time(hour=11), total_time=15)
+        self.create_booking(self.user, start_time=time(hour=11, minute=20), total_time=15)
+
+    def post(self, url):
+        return self.client.post(url, json.dumps({"query": self.query}), content_type='application/json')
+
+    def test_compact_response(self):
+        """Test that responses are encoded without whitespace."""
+        response = self.post(self.url)
+        assert b' ' not in response.content
+        assert len(response.json()['data']['bookings']['edges']) == 2
+
+    def test_streamed_response(self):
+        """Test that a streamed response holds the same result as a regular response."""
+        with mock.patch('scheduler.api.encoding.EDGES_PER_SLICE', 1):
+            response = self.post(f'{self.url}?stream=1')
+
+        assert response.streaming
+        assert json.loads(b''.join(response.streaming_content)) == self.post(self.url).json()
+
+    def test_iter_encode(self):
+        """Test that chunked encoding matches the one-shot encoding."""
+        response = bookings_response(600)
+        assert ''.join(iter_encode(response, chunk_size=1024)) == encode(response)
+
+    def test_streaming_batch_rejected(self):
+        """Test that batched requests cannot be streamed."""
+        response = self.client.post(
+            f'{self.url}?stream=1', json.dumps([{"query": self.query}]), content_type='application/json'
+        )
+        assert response.status_code == 400
+        assert response.json()['errors'][0]['message'] == 'Batched requests cannot be streamed.'
+
+
+class MetricsTests(BaseTests):
+    """
+    Prometheus metrics endpoint tests.
+    """
+    url = '/api/graphql'
+
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings_override = self.settings(METRICS={**settings.METRICS, 'ENABLED': True, 'DIRECTORY': self.directory})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        metrics._reset()
+        self.addCleanup(metrics._reset)
+
+        self.user = self.create_user(username="metrics-user")
+        self.create_availability(self.user)
+
+    def post(self, query, **body):
+        return self.client.post(self.url, json.dumps({"query": query, **body}), content_type='application/json')
+
+    def scrape(self):
+        response = self.client.get('/api/metrics')
+        assert response.status_code == 200
+        return response.content.decode().splitlines()
+
+    def test_operation_metrics(self):
+        """Test that latency, query counts and errors are recorded by operation name."""
+        self.post('query userBookings { bookings(username: "metrics-user") { edges { node { id } } } }')
+        self.post('query broken { availability(id: "QXZhaWxhYmlsaXR5VHlwZTox") { id } }')
+
+        lines = self.scrape()
+        assert 'graphql_request_duration_seconds_count{operation="userBookings"} 1' in lines
+        assert 'graphql_request_db_queries_bucket{operation="userBookings",le="2"} 1' in lines
+        assert 'graphql_errors_total{operation="broken",type="PermissionDenied"} 1' in lines
+
+    def test_booking_validation_outcomes(self):
+        """Test that booking validations are counted by outcome with the occupancy cache lookups."""
+        mutation = '''
+            mutation book($username: String!) {
+              createBooking(
+                username: $username, fullName: "Demo", email: "a@a.com",
+                targetDate: "%s", targetTime: "11:00", totalTime: 15
+              ) { success }
+            }
+        ''' % date.today().isoformat()
+        self.create_user(username="metrics-user2")
+        for username in ('metrics-user', 'metrics-user', 'metrics-user2'):
+            self.post(mutation, variables={"username": username})
+
+        lines = self.scrape()
+        for outcome in ('success', 'overlap', 'no_availability'):
+            assert f'booking_validations_total{{outcome="{outcome}"}} 1' in lines
+        assert 'cache_requests_total{cache="occupancy",result="hit"} 2' in lines
+        assert 'cache_requests_total{cache="occupancy",result="miss"} 1' in lines
+
+    def test_worker_processes_merged(self):
+        """Test that the files of other worker processes are summed in."""
+        with open(os.path.join(self.directory, 'other-worker.json'), 'w') as other:
+            json.dump({
+                "counters": [["booking_validations_total", [["outcome", "success"]], 2]],
+                "histograms": [],
+            }, other)
+        metrics.inc('booking_validations_total', outcome='success')
+
+        assert 'booking_validations_total{outcome="success"} 3' in self.scrape()
+
+    def test_stale_worker_files_deleted(self):
+        """Test that the files of workers which stopped writing are deleted instead of summed in."""
+        path = os.path.join(self.directory, 'exited-worker.json')
+        with open(path, 'w') as exited:
+            json.dump({
+                "counters": [["booking_validations_total", [["outcome", "success"]], 2]],
+                "histograms": [],
+            }, exited)
+        stale = datetime.now().timestamp() - settings.METRICS["STALE_AFTER_SECONDS"] - 60
+        os.utime(path, (stale, stale))
+        metrics.inc('booking_validations_total', outcome='success')
+
+        assert 'booking_validations_total{outcome="success"} 1' in self.scrape()
+        assert not os.path.exists(path)
+
+
+class UpcomingBookingsTests(BaseAPITests):
+    """
+    User node upcoming bookings tests.
+    """
+    query = '''
+        query {
+          users(username_Istartswith: "host") {
+            edges { node { username upcomingBookingsCount nextBooking { startTime user { username } } } }
+          }
+        }
+    '''
+
+    def setUp(self) -> None:
+        caches[settings.UPCOMING_BOOKINGS_CACHE["ALIAS"]].clear()
+        self.tomorrow = date.today() + timedelta(days=1)
+        self.hosts = [self.create_user(username=f"host-{index}") for index in range(3)]
+        for index, host in enumerate(self.hosts):
+            for hour in range(index):
+                self.book(host, self.tomorrow, time(hour=10 + hour))
+        # Past bookings are not upcoming.
+        self.book(self.hosts[2], date.today() - timedelta(days=1), time(hour=9))
+
+    def book(self, user, target_date, start_time):
+        return Booking.objects.create(
+            user=user, full_name='DemoX', email='a@a.com', date=target_date, start_time=start_time, total_time=15
+        )
+
+    def users(self):
+        data = self.execute_and_assert_success(self.query, context_value=RequestFactory().get('/'))
+        return {edge['node']['username']: edge['node'] for edge in data['users']['edges']}
+
+    def test_loaded_per_page(self):
+        """Test that the upcoming bookings of a page of users are loaded in one grouped query."""
+        # Connection count & page queries, the grouped count and the next bookings.
+        with self.assertNumQueries(4):
+            users = self.users()
+
+        assert users['host-0'] == {'username': 'host-0', 'upcomingBookingsCount': 0, 'nextBooking': None}
+        assert users['host-1']['upcomingBookingsCount'] == 1
+        assert users['host-2']['upcomingBookingsCount'] == 2
+        assert users['host-2']['nextBooking'] == {'startTime': '10:00:00', 'user': {'username': 'host-2'}}
+
+    def test_cached_until_booking_written(self):
+        """Test that cached upcoming bookings are reloaded after a booking of the user is written."""
+        self.users()
+        with self.assertNumQueries(2):
+            self.users()
+
+        booking = self.book(self.hosts[0], self.tomorrow, time(hour=9))
+        users = self.users()
+        assert users['host-0']['upcomingBookingsCount'] == 1
+        assert users['host-0']['nextBooking']['startTime'] == '09:00:00'
+
+        booking.user = self.hosts[1]
+        booking.save()
+        users = self.users()
+        assert users['host-0']['upcomingBookingsCount'] == 0
+        assert users['host-1']['upcomingBookingsCount'] == 2
+        assert users['host-1']['nextBooking'] == {'startTime': '09:00:00', 'user': {'username': 'host-1'}}
+
+        booking.delete()
+        assert self.users()['host-1']['upcomingBookingsCount'] == 1
+
+    def test_reloaded_once_next_booking_started(self):
+        """Test that cached upcoming bookings are reloaded once the next booking has started."""
+        host = self.hosts[2]
+        assert load_upcoming_bookings([host.pk])[host.pk][0] == 2
+
+        started = datetime.combine(self.tomorrow, time(hour=10, minute=5))
+        count, next_booking = load_upcoming_bookings([host.pk], now=started)[host.pk]
+        assert count == 1
+        assert next_booking.start_time == time(hour=11)
+
+    def test_short_timeout_on_local_cache(self):
+        """Test that entries of a process local cache expire quickly, those of a shared cache last longer."""
+        config = settings.UPCOMING_BOOKINGS_CACHE
+        with mock.patch.object(LocMemCache, 'set_many') as set_many:
+            load_upcoming_bookings([self.hosts[0].pk])
+        assert set_many.call_args[0][1] == config["LOCAL_TIMEOUT"]
+
+        with self.settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}):
+            with mock.patch.object(DummyCache, 'set_many') as set_many:
+                load_upcoming_bookings([self.hosts[0].pk])
+        assert set_many.call_args[0][1] == config["TIMEOUT"]
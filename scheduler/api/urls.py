@@ -3,10 +3,11 @@ Scheduler API URL configuration.
 """
 from django.urls import path
 from django.views.decorators.csrf import csrf_exempt
-from graphene_django.views import GraphQLView
 
-from .schema import schema
+from .views import SchedulerGraphQLView, metrics_view, printed_schema
 
 urlpatterns = [
-    path("graphql", csrf_exempt(GraphQLView.as_view(graphiql=True, schema=schema))),
+    path("graphql", csrf_exempt(SchedulerGraphQLView.as_view(graphiql=True))),
+    path("schema.graphql", printed_schema),
+    path("metrics", metrics_view),
 ]
@@ -0,0 +1,131 @@
+"""
+Scheduler API views.
+"""
+from contextlib import ExitStack
+from functools import lru_cache
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseNotAllowed, StreamingHttpResponse
+from django.http.response import HttpResponseBadRequest
+from graphene_django.settings import graphene_settings
+from graphene_django.views import GraphQLView, HttpError
+
+from scheduler.meeting_scheduler import metrics
+
+from .encoding import encode, iter_encode
+from .instrumentation import track_operation
+from .profiling import get_operation_name, profiled, should_profile
+from .slow_queries import ResolverTrackingMiddleware, slow_query_log
+
+
+class SchedulerGraphQLView(GraphQLView):
+    """
+    GraphQL view accepting either a single operation or a list of operations.
+
+    A JSON array body is executed as a batch: every operation runs against the
+    same request object as its context, so anything cached on the context
+    (e.g. `request.loaders`) is shared by the whole batch. A JSON object body
+    keeps the regular single operation behaviour, GraphiQL included.
+
+    Responses are encoded compactly, `?stream=1` streams the response of a single
+    operation with its connection edges encoded a slice at a time.
+    """
+    streaming = False
+
+    def dispatch(self, request, *args, **kwargs):
+        """Stream the response when `?stream=1` is requested."""
+        if not request.GET.get("stream"):
+            return super().dispatch(request, *args, **kwargs)
+
+        try:
+            if request.method.lower() != "post":
+                raise HttpError(HttpResponseNotAllowed(["POST"], "Streamed responses require POST requests."))
+            data = self.parse_body(request)
+            if self.batch:
+                raise HttpError(HttpResponseBadRequest("Batched requests cannot be streamed."))
+            self.streaming = True
+            result, status_code = self.get_response(request, data)
+            return StreamingHttpResponse(result, status=status_code, content_type="application/json")
+        except HttpError as e:
+            response = e.response
+            response["Content-Type"] = "application/json"
+            response.content = encode({"errors": [self.format_error(e)]})
+            return response
+
+    def json_encode(self, request, d, pretty=False):
+        """Encode with the lean encoder, or lazily in chunks when streaming."""
+        if self.pretty or pretty or request.GET.get("pretty"):
+            return super().json_encode(request, d, pretty)
+        if self.streaming:
+            return iter_encode(d)
+        return encode(d)
+
+    def parse_body(self, request):
+        """Switch to batch mode when the JSON body is an array."""
+        if self.get_content_type(request) == "application/json":
+            self.batch = request.body.lstrip()[:1] == b"["
+
+        data = super().parse_body(request)
+        if self.batch and len(data) > settings.GRAPHQL_BATCH_MAX_OPERATIONS:
+            raise HttpError(HttpResponseBadRequest(
+                f"Batch requests are limited to {settings.GRAPHQL_BATCH_MAX_OPERATIONS} operations."
+            ))
+        return data
+
+    def execute_graphql_request(self, request, data, query, variables, operation_name, show_graphiql=False):
+        """
+        Execute the operation with its request metrics and the slow-query log, under
+        cProfile when profiling is requested or sampled.
+        """
+        with ExitStack() as stack:
+            if query and settings.METRICS["ENABLED"]:
+                results = stack.enter_context(track_operation(operation_name or get_operation_name(query)))
+            else:
+                results = []
+            if query and settings.SLOW_QUERY_LOG["ENABLED"]:
+                stack.enter_context(slow_query_log(operation_name, query))
+            if query and should_profile(request):
+                stack.enter_context(profiled(operation_name or get_operation_name(query)))
+            result = super().execute_graphql_request(
+                request, data, query, variables, operation_name, show_graphiql
+            )
+            results.append(result)
+            return result
+
+    def get_middleware(self, request):
+        """Add resolver tracking for the slow-query log."""
+        middleware = super().get_middleware(request)
+        if settings.SLOW_QUERY_LOG["ENABLED"]:
+            return list(middleware or []) + [ResolverTrackingMiddleware()]
+        return middleware
+
+    def get_context(self, request):
+        """Return the request with a per-request cache shared by batched operations."""
+        if not hasattr(request, "loaders"):
+            request.loaders = {}
+        return request
+
+
+@lru_cache(maxsize=None)
+def read_printed_schema():
+    """Return the printed schema artifact, building the schema only if the artifact is missing."""
+    try:
+        with open(graphene_settings.SCHEMA_OUTPUT) as schema_file:
+            return schema_file.read()
+    except FileNotFoundError:
+        from graphql import print_schema
+
+        from .schema import get_schema
+        return print_schema(get_schema())
+
+
+def printed_schema(request):
+    """Serve the printed GraphQL schema (SDL) for tooling and clients."""
+    return HttpResponse(read_printed_schema(), content_type="text/plain; charset=utf-8")
+
+
+def metrics_view(request):
+    """Serve the metrics of all the worker processes in the Prometheus text format."""
+    if not settings.METRICS["ENABLED"]:
+        raise Http404("Metrics are disabled.")
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1 @@
+default_app_config = 'scheduler.meeting_scheduler.apps.MeetingSchedulerConfig'
@@ -5,7 +5,7 @@ from django.apps import apps
 from django.contrib import admin
 from django.contrib.sessions.models import Session
 
-from .models import Booking, Availability, UserModel as User
+from .models import BackgroundTask, Booking, Availability, DailyUtilization, SlotHold, UserModel as User
 
 admin.site.site_header = "Meeting Scheduler Admin panel"
 
@@ -28,9 +28,28 @@ class BookingsAdmin(admin.ModelAdmin):
     list_display = ('full_name', 'email', 'date', 'start_time', 'end_time', 'total_time',)
 
 
+class SlotHoldAdmin(admin.ModelAdmin):
+    """Slot holds admin model."""
+    list_display = ('user', 'date', 'start_time', 'end_time', 'expires_at',)
+
+
+class DailyUtilizationAdmin(admin.ModelAdmin):
+    """Daily utilization admin model."""
+    list_display = ('user', 'date', 'booked_minutes', 'available_minutes',)
+
+
+class BackgroundTaskAdmin(admin.ModelAdmin):
+    """Background tasks admin model."""
+    list_display = ('name', 'status', 'attempts', 'run_after', 'updated_at',)
+    list_filter = ('status',)
+
+
 admin.site.register(User)
 admin.site.register(Availability)
 admin.site.register(Booking, BookingsAdmin)
+admin.site.register(SlotHold, SlotHoldAdmin)
+admin.site.register(DailyUtilization, DailyUtilizationAdmin)
+admin.site.register(BackgroundTask, BackgroundTaskAdmin)
 
 auth_app = apps.get_app_config('graphql_auth')
 for model_name, model in auth_app.models.items():
@@ -6,3 +6,6 @@ class MeetingSchedulerConfig(AppConfig):
     """Scheduler app config"""
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'scheduler.meeting_scheduler'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,140 @@
+"""
+In-process background tasks for scheduler app.
+
+Tasks are stored in the `BackgroundTask` table when enqueued and handed to a
+bounded thread pool once the enqueuing transaction commits. Failed tasks are
+re-submitted after a back-off. When the pool is saturated or the process dies,
+the row stays in the table and is run by the `drain_tasks` management command.
+"""
+import logging
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import BackgroundTask
+
+log = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(settings.BACKGROUND_TASKS['QUEUE_SIZE'])
+
+
+def get_pool():
+    """Returns the process wide worker pool, creating it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=settings.BACKGROUND_TASKS['WORKERS'],
+                thread_name_prefix='background-task',
+            )
+        return _pool
+
+
+def enqueue(func, **kwargs):
+    """
+    Stores a call of `func(**kwargs)` and runs it in the pool after the current transaction commits.
+
+    Arguments:
+        func: module level function, it is stored by its dotted path.
+        kwargs: JSON serializable keyword arguments of the call.
+    Returns:
+        BackgroundTask: the stored task.
+    """
+    task = BackgroundTask.objects.create(name=f'{func.__module__}.{func.__name__}', kwargs=kwargs)
+    transaction.on_commit(lambda: submit(task.pk))
+    return task
+
+
+def submit(task_id):
+    """Hands the task to the pool, leaving it queued in the database if the pool is full."""
+    if not _slots.acquire(blocking=False):
+        log.warning('Background task pool is full, task %s is left for drain_tasks.', task_id)
+        return
+    try:
+        get_pool().submit(_run_in_worker, task_id)
+    except RuntimeError:
+        _slots.release()
+        raise
+
+
+def _run_in_worker(task_id):
+    """Pool entry point, runs the task with its own database connection."""
+    try:
+        close_old_connections()
+        task = run_task(task_id)
+        if task is not None and task.status == BackgroundTask.PENDING:
+            retry = threading.Timer((task.run_after - timezone.now()).total_seconds(), submit, args=(task_id,))
+            retry.daemon = True
+            retry.start()
+    except Exception:  # pylint: disable=broad-except
+        log.exception('Background task %s crashed.', task_id)
+    finally:
+        close_old_connections()
+        _slots.release()
+
+
+def run_task(task_id):
+    """
+    Claims and executes a due pending task.
+
+    Failed tasks are retried with a linear back-off until `MAX_ATTEMPTS` is reached.
+    Returns:
+        BackgroundTask: the executed task, None if it was not claimed by this call.
+    """
+    claimed = BackgroundTask.objects.filter(
+        pk=task_id, status=BackgroundTask.PENDING, run_after__lte=timezone.now()
+    ).update(status=BackgroundTask.RUNNING, updated_at=timezone.now())
+    if not claimed:
+        return None
+
+    task = BackgroundTask.objects.get(pk=task_id)
+    task.attempts += 1
+    try:
+        import_string(task.name)(**task.kwargs)
+    except Exception:  # pylint: disable=broad-except
+        task.last_error = traceback.format_exc()
+        if task.attempts < settings.BACKGROUND_TASKS['MAX_ATTEMPTS']:
+            task.status = BackgroundTask.PENDING
+            task.run_after = timezone.now() + timedelta(
+                seconds=settings.BACKGROUND_TASKS['RETRY_DELAY_SECONDS'] * task.attempts
+            )
+        else:
+            task.status = BackgroundTask.FAILED
+        log.warning('Background task %s (%s) failed, attempt %s.', task.pk, task.name, task.attempts)
+    else:
+        task.status = BackgroundTask.DONE
+    task.save(update_fields=['status', 'attempts', 'run_after', 'last_error', 'updated_at'])
+    return task
+
+
+def drain(stale_after=None):
+    """
+    Runs every due pending task in the calling thread.
+
+    Arguments:
+        stale_after: seconds after which running tasks are considered abandoned by a
+            dead worker and put back in the queue.
+    Returns:
+        int: number of tasks executed.
+    """
+    if stale_after is not None:
+        BackgroundTask.objects.filter(
+            status=BackgroundTask.RUNNING,
+            updated_at__lte=timezone.now() - timedelta(seconds=stale_after),
+        ).update(status=BackgroundTask.PENDING)
+
+    executed = 0
+    due = BackgroundTask.objects.filter(
+        status=BackgroundTask.PENDING, run_after__lte=timezone.now()
+    ).order_by('run_after').values_list('pk', flat=True)
+    for task_id in list(due):
+        executed += run_task(task_id) is not None
+    return executed
@@ -0,0 +1,198 @@
+"""
+Bulk availability writes for scheduler app.
+"""
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Availability
+from .utilization import availability_dates, deferred_refresh, refresh_utilization
+
+WINDOW_FIELDS = ('from_time', 'to_time', 'interval_mints')
+
+
+def _snapshot(window):
+    return {field: getattr(window, field) for field in WINDOW_FIELDS}
+
+
+def _runs(windows):
+    """Yields the runs of overlapping or adjacent windows with the same interval."""
+    run, run_end = [], None
+    for window in sorted(windows, key=lambda window: (window.interval_mints, window.from_time)):
+        if run and window.interval_mints == run[0].interval_mints and window.from_time <= run_end:
+            run.append(window)
+            run_end = max(run_end, window.to_time)
+            continue
+        if run:
+            yield run
+        run, run_end = [window], window.to_time
+    if run:
+        yield run
+
+
+def _load_neighbours(user, windows, exclude):
+    """
+    Returns the user's stored windows overlapping or adjacent to the span of the
+    windows, loading again until the span stops growing so chains of stored windows
+    touching each other are loaded whole.
+    """
+    loaded = {}
+    start = min(window.from_time for window in windows)
+    end = max(window.to_time for window in windows)
+    while True:
+        found = Availability.objects.filter(
+            user=user, from_time__lte=end, to_time__gte=start,
+        ).exclude(pk__in=list(exclude) + list(loaded))
+        loaded.update((window.pk, window) for window in found)
+        spanned = (
+            min([start] + [window.from_time for window in loaded.values()]),
+            max([end] + [window.to_time for window in loaded.values()]),
+        )
+        if spanned == (start, end):
+            return list(loaded.values())
+        start, end = spanned
+
+
+def _coalesce(candidates, loaded):
+    """
+    Merges the candidate windows with each other and the loaded stored windows, the
+    way `Availability.coalesce` does for a single window.
+
+    Returns:
+        dict: {id(window): keeper} of the windows merged into another one.
+    """
+    candidate_ids = {id(window) for window in candidates}
+    replaced = {}
+    for run in _runs(candidates + loaded):
+        if len(run) == 1 or not any(id(window) in candidate_ids for window in run):
+            continue
+        # Updated windows are kept first, then stored ones, new windows are only created when alone.
+        keeper = min(run, key=lambda window: (
+            0 if window.pk and id(window) in candidate_ids else 1 if window.pk else 2
+        ))
+        keeper.from_time = min(window.from_time for window in run)
+        keeper.to_time = max(window.to_time for window in run)
+        for window in run:
+            if window is not keeper:
+                replaced[id(window)] = keeper
+    return replaced
+
+
+def _to_pk(value):
+    """Returns the availability primary key of `value`, None when it is not a valid key."""
+    try:
+        return Availability._meta.pk.to_python(value)
+    except ValidationError:
+        return None
+
+
+def upsert_availabilities(user, changes):
+    """
+    Creates & updates availabilities of the user in one transaction.
+
+    Updates only write the columns they change, windows are coalesced with each
+    other and the stored ones like single writes are, and the daily utilization
+    of every touched day is refreshed once.
+    Arguments:
+        user (UserModel): owner of the availabilities.
+        changes: list of dicts of `WINDOW_FIELDS` values, with the `id` of
+            the availability to update or without for new availabilities.
+    Returns:
+        list of the resulting availabilities, in the order of the changes.
+    Raises:
+        Availability.DoesNotExist - with the ids, as given, the user does not own;
+            nothing is written.
+        ValueError - when a window would not start before it ends, nothing is written.
+    """
+    keys = {change['id']: _to_pk(change['id']) for change in changes if change.get('id')}
+    with transaction.atomic(), deferred_refresh():
+        owned = Availability.objects.filter(
+            user=user, pk__in=[pk for pk in keys.values() if pk is not None]
+        ).in_bulk()
+        missing = [key for key, pk in keys.items() if pk not in owned]
+        if missing:
+            raise Availability.DoesNotExist(missing)
+
+        previous = {pk: _snapshot(window) for pk, window in owned.items()}
+        results, candidates = [], {}
+        for change in changes:
+            values = {field: change[field] for field in WINDOW_FIELDS if field in change}
+            if 'interval_mints' in values:
+                values['interval_mints'] = str(values['interval_mints'])
+            window = owned[keys[change['id']]] if change.get('id') else Availability(user=user)
+            for field, value in values.items():
+                setattr(window, field, value)
+            if window.from_time >= window.to_time:
+                raise ValueError(f'Availability from {window.from_time} to {window.to_time} must start before it ends.')
+            results.append(window)
+            candidates[id(window)] = window
+
+        candidates = list(candidates.values())
+        loaded = _load_neighbours(user, candidates, exclude=list(owned)) if candidates else []
+        # Stored windows are snapshot before merging, which may widen them.
+        previous.update((window.pk, _snapshot(window)) for window in loaded)
+        replaced = _coalesce(candidates, loaded)
+
+        removed, updates, created, dates = [], {}, [], []
+        for window in candidates + loaded:
+            if id(window) in replaced:
+                if window.pk:
+                    removed.append(window.pk)
+            elif not window.pk:
+                created.append(window)
+                dates += availability_dates(window.from_time, window.to_time)
+            else:
+                before = previous[window.pk]
+                changed = tuple(field for field in WINDOW_FIELDS if getattr(window, field) != before[field])
+                if changed:
+                    updates.setdefault(changed, []).append(window)
+                    dates += availability_dates(before['from_time'], before['to_time'])
+                    dates += availability_dates(window.from_time, window.to_time)
+
+        if removed:
+            Availability.objects.filter(pk__in=removed).delete()
+        for fields, windows in updates.items():
+            Availability.objects.bulk_update(windows, fields)
+        Availability.objects.bulk_create(created)
+        _assign_created_keys(user, created)
+        # Bulk writes send no signals, the touched days are refreshed here.
+        refresh_utilization(user.pk, dates)
+
+    results = (replaced.get(id(window), window) for window in results)
+    return list({id(window): window for window in results}.values())
+
+
+def _assign_created_keys(user, created):
+    """Reads back the primary keys of created windows on backends not returning them."""
+    missing = [window for window in created if window.pk is None]
+    if not missing:
+        return
+    keys = Availability.objects.filter(user=user).filter(reduce(or_, (
+        Q(from_time=window.from_time, to_time=window.to_time) for window in missing
+    ))).values_list('from_time', 'to_time', 'pk')
+    pks = {(from_time, to_time): pk for from_time, to_time, pk in keys}
+    for window in missing:
+        window.pk = pks.get((window.from_time, window.to_time))
+
+
+def delete_availabilities(user, ids):
+    """
+    Deletes availabilities of the user in one transaction.
+
+    The daily utilization of every touched day is refreshed once.
+    Returns:
+        int: number of deleted availabilities.
+    Raises:
+        Availability.DoesNotExist - when the user does not own all of them, nothing is deleted.
+    """
+    ids = {_to_pk(pk) for pk in ids}
+    if None in ids:
+        raise Availability.DoesNotExist()
+    with transaction.atomic(), deferred_refresh():
+        _, deleted = Availability.objects.filter(user=user, pk__in=ids).delete()
+        if deleted.get(Availability._meta.label, 0) != len(ids):
+            raise Availability.DoesNotExist()
+    return len(ids)
@@ -1,7 +1,9 @@
+from datetime import datetime, time, timedelta
+
 import django_filters
 from django.db.models import Q
 
-from .models import Booking
+from .models import Availability, Booking, UserModel
 
 
 def filter_queryset_with_fields_and_matcher(fields, matcher):
@@ -18,6 +20,16 @@ def filter_queryset_with_fields_and_matcher(fields, matcher):
     return _filter_qs
 
 
+def filter_booking_username(queryset, _, value):
+    """
+    Keeps bookings of the user, resolved by a subquery on the user table so the
+    (user, date, start_time) index serves the date range instead of a join.
+    """
+    if value:
+        return queryset.filter(user__in=UserModel.objects.filter(username__iexact=value).values('pk'))
+    return queryset
+
+
 class BookingFilter(django_filters.FilterSet):
     """Booking query filter. """
     search = django_filters.CharFilter(
@@ -26,13 +38,35 @@ class BookingFilter(django_filters.FilterSet):
             matcher="icontains"
         )
     )
-    username = django_filters.CharFilter(
-        method=filter_queryset_with_fields_and_matcher(
-            fields=['user__username'],
-            matcher='iexact'
-        )
-    )
+    username = django_filters.CharFilter(method=filter_booking_username)
+
+    date_from = django_filters.DateFilter(field_name='date', lookup_expr='gte')
+    date_to = django_filters.DateFilter(field_name='date', lookup_expr='lte')
+    starts_after = django_filters.TimeFilter(field_name='start_time', lookup_expr='gte')
+    ends_before = django_filters.TimeFilter(field_name='end_time', lookup_expr='lte')
 
     class Meta:
         model = Booking
         fields = ["search", "user"]
+
+
+def filter_availability_on_or_after(queryset, _, value):
+    """Keeps availabilities ending on or after the start of the date."""
+    return queryset.filter(to_time__gte=datetime.combine(value, time.min))
+
+
+def filter_availability_on_or_before(queryset, _, value):
+    """Keeps availabilities starting before the end of the date."""
+    return queryset.filter(from_time__lt=datetime.combine(value + timedelta(days=1), time.min))
+
+
+class AvailabilityFilter(django_filters.FilterSet):
+    """Availability query filter. """
+    date_from = django_filters.DateFilter(method=filter_availability_on_or_after)
+    date_to = django_filters.DateFilter(method=filter_availability_on_or_before)
+    starts_after = django_filters.DateTimeFilter(field_name='from_time', lookup_expr='gte')
+    ends_before = django_filters.DateTimeFilter(field_name='to_time', lookup_expr='lte')
+
+    class Meta:
+        model = Availability
+        fields = ['user__username']
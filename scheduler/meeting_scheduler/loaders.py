@@ -0,0 +1,118 @@
+"""
+Batched & cached loading of the upcoming bookings of users for scheduler app.
+
+User nodes resolve their upcoming bookings through one `DataLoader` per request, so a
+page of users costs a single grouped query for the users missing from the cache.
+Cached entries are dropped when a booking of the user is written and are reloaded
+once the user's next booking has started.
+"""
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models import Count, OuterRef, Q, Subquery
+from promise import Promise
+from promise.dataloader import DataLoader
+
+from . import metrics
+from .models import Booking, UserModel
+
+
+def _cache():
+    return caches[settings.UPCOMING_BOOKINGS_CACHE["ALIAS"]]
+
+
+def _timeout():
+    """Returns the cache timeout, short on process local caches which invalidations of other workers miss."""
+    config = settings.UPCOMING_BOOKINGS_CACHE
+    if isinstance(_cache(), LocMemCache):
+        return min(config["TIMEOUT"], config["LOCAL_TIMEOUT"])
+    return config["TIMEOUT"]
+
+
+def cache_key(user_id):
+    """Returns the cache key of the user's upcoming bookings."""
+    return f"upcoming-bookings:{user_id}"
+
+
+def upcoming_filter(now, prefix=""):
+    """Returns the filter of bookings starting at or after `now`, `prefix` being the lookup path to the booking."""
+    return Q(**{f"{prefix}date__gt": now.date()}) | Q(
+        **{f"{prefix}date": now.date(), f"{prefix}start_time__gte": now.time()}
+    )
+
+
+def _is_fresh(entry, now):
+    """Tells whether a cached entry is still valid, i.e. its next booking has not started yet."""
+    next_booking = entry[1]
+    return next_booking is None or datetime.combine(next_booking.date, next_booking.start_time) >= now
+
+
+def load_upcoming_bookings(user_ids, now=None):
+    """
+    Returns the upcoming bookings of the users.
+
+    Users missing from the cache are loaded with one grouped query, plus one query
+    for their next bookings.
+    Returns:
+        dict: {user_id: (upcoming bookings count, next booking or None)}
+    """
+    now = now or datetime.now()
+    cached = _cache().get_many([cache_key(user_id) for user_id in user_ids])
+    results = {
+        user_id: cached[cache_key(user_id)] for user_id in user_ids
+        if cache_key(user_id) in cached and _is_fresh(cached[cache_key(user_id)], now)
+    }
+    missing = [user_id for user_id in user_ids if user_id not in results]
+    metrics.inc("cache_requests_total", len(results), cache="upcoming_bookings", result="hit")
+    metrics.inc("cache_requests_total", len(missing), cache="upcoming_bookings", result="miss")
+    if not missing:
+        return results
+
+    next_booking = Booking.objects.filter(upcoming_filter(now), user_id=OuterRef("pk")).order_by("date", "start_time")
+    rows = list(UserModel.objects.filter(pk__in=missing).annotate(
+        upcoming_bookings_count=Count("user_bookings", filter=upcoming_filter(now, "user_bookings__")),
+        next_booking_id=Subquery(next_booking.values("pk")[:1]),
+    ).values_list("pk", "upcoming_bookings_count", "next_booking_id"))
+    # Cached with their user, which `nextBooking { user }` reads, less its password hash.
+    bookings = Booking.objects.select_related("user").defer("user__password").in_bulk(
+        [booking_id for _, _, booking_id in rows if booking_id is not None]
+    )
+
+    loaded = {user_id: (count, bookings.get(booking_id)) for user_id, count, booking_id in rows}
+    _cache().set_many(
+        {cache_key(user_id): entry for user_id, entry in loaded.items()},
+        _timeout(),
+    )
+    results.update(loaded)
+    return results
+
+
+def invalidate_upcoming_bookings(user_ids):
+    """
+    Drops the cached upcoming bookings of the users, now and once the current
+    transaction commits so that concurrent reads cannot cache uncommitted state.
+    """
+    keys = [cache_key(user_id) for user_id in user_ids if user_id is not None]
+    if keys:
+        _cache().delete_many(keys)
+        transaction.on_commit(lambda: _cache().delete_many(keys))
+
+
+class UpcomingBookingsLoader(DataLoader):
+    """Loads the (upcoming bookings count, next booking) of users in one batch."""
+
+    def batch_load_fn(self, user_ids):
+        results = load_upcoming_bookings(user_ids)
+        return Promise.resolve([results.get(user_id, (0, None)) for user_id in user_ids])
+
+
+def get_loader(context, loader_class):
+    """Returns the loader of the request, shared by all the fields & operations of the request."""
+    if not hasattr(context, "loaders"):
+        context.loaders = {}
+    if loader_class.__name__ not in context.loaders:
+        context.loaders[loader_class.__name__] = loader_class()
+    return context.loaders[loader_class.__name__]
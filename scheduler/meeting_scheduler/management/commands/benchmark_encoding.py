@@ -0,0 +1,52 @@
+"""
+Management command benchmarking the GraphQL response encoders.
+"""
+import timeit
+from collections import OrderedDict
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from graphene_django.views import GraphQLView
+
+from scheduler.api.schema import get_schema
+from scheduler.api.views import SchedulerGraphQLView
+
+
+def bookings_response(edges):
+    """Returns a `bookings` connection response with the provided number of edges."""
+    return {"data": OrderedDict(bookings=OrderedDict(edges=[
+        OrderedDict(node=OrderedDict(
+            id=f"Qm9va2luZ1R5cGU6{index}", fullName="Demo User", email="demo@example.com",
+            date=f"2022-01-{index % 28 + 1:02d}", startTime="11:30:00", endTime="11:45:00",
+            totalTime=15, updatedAt="2022-01-01T10:00:00.123456",
+            user=OrderedDict(id=str(index % 50), username=f"host-{index % 50}", email="host@example.com"),
+        ))
+        for index in range(edges)
+    ]))}
+
+
+class Command(BaseCommand):
+    help = "Benchmark the lean and streamed response encoders against graphene's GraphQLView encoder."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--edges", type=int, default=5000, help="Number of connection edges.")
+        parser.add_argument("--repeat", type=int, default=20, help="Number of encodings timed.")
+
+    def handle(self, *args, edges, repeat, **options):
+        request = RequestFactory().post("/api/graphql")
+        response = bookings_response(edges)
+        current = GraphQLView(schema=get_schema())
+        lean = SchedulerGraphQLView(schema=get_schema())
+        streamed = SchedulerGraphQLView(schema=get_schema())
+        streamed.streaming = True
+
+        encoders = [
+            ("graphene GraphQLView", lambda: current.json_encode(request, response)),
+            ("lean", lambda: lean.json_encode(request, response)),
+            ("streamed", lambda: "".join(streamed.json_encode(request, response))),
+        ]
+        baseline = None
+        for name, encoder in encoders:
+            seconds = timeit.timeit(encoder, number=repeat) / repeat
+            baseline = baseline or seconds
+            self.stdout.write(f"{name:<22}{seconds * 1000:9.2f} ms  {baseline / seconds:5.2f}x")
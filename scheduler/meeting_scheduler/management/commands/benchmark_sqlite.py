@@ -0,0 +1,128 @@
+"""
+Management command stress testing SQLite with concurrent reads & writes, on the default
+and the production database profiles.
+"""
+import random
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+
+SCHEMA = [
+    'CREATE TABLE booking (id INTEGER PRIMARY KEY, user_id INTEGER, date TEXT, start_time INTEGER, end_time INTEGER)',
+    'CREATE INDEX booking_user_date ON booking (user_id, date, start_time)',
+]
+
+
+def book(alias, rng, users):
+    """Checks the slot for overlaps then inserts the booking in one transaction, like `CreateBooking`."""
+    user_id, day, start_time = rng.randrange(users), f'2022-01-{rng.randint(1, 28):02d}', rng.randrange(0, 1440, 15)
+    with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+        cursor.execute(
+            'SELECT COUNT(*) FROM booking WHERE user_id = %s AND date = %s AND start_time <= %s AND end_time >= %s',
+            [user_id, day, start_time + 15, start_time],
+        )
+        if not cursor.fetchone()[0]:
+            cursor.execute(
+                'INSERT INTO booking (user_id, date, start_time, end_time) VALUES (%s, %s, %s, %s)',
+                [user_id, day, start_time, start_time + 15],
+            )
+
+
+def read(alias, rng, users):
+    """Reads the bookings of a user's day."""
+    with connections[alias].cursor() as cursor:
+        cursor.execute(
+            'SELECT id, start_time, end_time FROM booking WHERE user_id = %s AND date = %s ORDER BY start_time',
+            [rng.randrange(users), f'2022-01-{rng.randint(1, 28):02d}'],
+        )
+        cursor.fetchall()
+
+
+def stress(database, threads=8, seconds=5.0, write_ratio=0.3, users=100, seed=0):
+    """
+    Runs reads & writes from concurrent threads against a new database file with the
+    provided settings. Connections are released after every operation like after a
+    request, so `CONN_MAX_AGE` applies.
+    Returns:
+        dict: operations, errors and latencies (seconds) of the run.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        alias = f'stress-{uuid.uuid4().hex}'
+        connections.databases[alias] = {**database, 'NAME': str(Path(directory) / 'stress.sqlite3')}
+        try:
+            with connections[alias].cursor() as cursor:
+                for statement in SCHEMA:
+                    cursor.execute(statement)
+            connections[alias].close()
+
+            results = {'operations': 0, 'errors': 0, 'latencies': []}
+            lock = threading.Lock()
+            deadline = time.perf_counter() + seconds
+
+            def worker(index):
+                rng = random.Random(f'{seed}-{index}')
+                operations, errors, latencies = 0, 0, []
+                try:
+                    while time.perf_counter() < deadline:
+                        operation = book if rng.random() < write_ratio else read
+                        started = time.perf_counter()
+                        try:
+                            operation(alias, rng, users)
+                            operations += 1
+                            latencies.append(time.perf_counter() - started)
+                        except OperationalError:
+                            errors += 1
+                        connections[alias].close_if_unusable_or_obsolete()
+                finally:
+                    connections[alias].close()
+                with lock:
+                    results['operations'] += operations
+                    results['errors'] += errors
+                    results['latencies'] += latencies
+
+            workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+            for thread in workers:
+                thread.start()
+            for thread in workers:
+                thread.join()
+            results['seconds'] = seconds
+            return results
+        finally:
+            connections[alias].close()
+            del connections[alias]
+            del connections.databases[alias]
+
+
+def _percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))] if values else 0.0
+
+
+class Command(BaseCommand):
+    help = "Stress test SQLite with concurrent reads & writes on the default and production database profiles."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8, help="Number of concurrent clients.")
+        parser.add_argument("--seconds", type=float, default=5.0, help="Duration of each run.")
+        parser.add_argument("--writes", type=float, default=0.3, help="Share of booking writes.")
+
+    def handle(self, *args, threads, seconds, writes, **options):
+        profiles = [('default', settings.DATABASES['default']), ('production', settings.PRODUCTION_DATABASE)]
+        baseline = None
+        self.stdout.write(f"{'profile':<12}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'errors':>10}")
+        for name, database in profiles:
+            results = stress(database, threads=threads, seconds=seconds, write_ratio=writes)
+            throughput = results['operations'] / results['seconds']
+            baseline = baseline or throughput
+            self.stdout.write(
+                f"{name:<12}{throughput:>10.0f}"
+                f"{_percentile(results['latencies'], 0.5) * 1000:>10.2f}"
+                f"{_percentile(results['latencies'], 0.95) * 1000:>10.2f}"
+                f"{results['errors']:>10}  {throughput / baseline:.2f}x"
+            )
@@ -0,0 +1,55 @@
+"""
+Management command coalescing overlapping & adjacent availability windows.
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from scheduler.meeting_scheduler.models import Availability
+from scheduler.meeting_scheduler.utilization import availability_dates, refresh_utilization
+
+
+def compact_availability(batch_size=500):
+    """
+    Merges every run of overlapping or adjacent windows of a user with the same interval
+    into the first window of the run.
+    Returns:
+        int: number of rows removed.
+    """
+    extended, removed = {}, []
+    current = None
+    windows = Availability.objects.filter(from_time__lt=F('to_time')).order_by(
+        'user_id', 'interval_mints', 'from_time'
+    ).only('user_id', 'interval_mints', 'from_time', 'to_time')
+
+    for window in windows.iterator():
+        same_run = (
+            current is not None
+            and (window.user_id, window.interval_mints) == (current.user_id, current.interval_mints)
+            and window.from_time <= current.to_time
+        )
+        if not same_run:
+            current = window
+            continue
+        removed.append(window.pk)
+        if window.to_time > current.to_time:
+            current.to_time = window.to_time
+            extended[current.pk] = current
+
+    with transaction.atomic():
+        # Merged rows go first, the extended windows may take their (user, from, to) key.
+        for start in range(0, len(removed), batch_size):
+            Availability.objects.filter(pk__in=removed[start:start + batch_size]).delete()
+        Availability.objects.bulk_update(extended.values(), ['to_time'], batch_size=batch_size)
+        # bulk_update sends no signals, the days of extended windows are refreshed here.
+        for window in extended.values():
+            refresh_utilization(window.user_id, availability_dates(window.from_time, window.to_time))
+    return len(removed)
+
+
+class Command(BaseCommand):
+    help = "Coalesce overlapping and adjacent availability windows with the same interval."
+
+    def handle(self, *args, **options):
+        removed = compact_availability()
+        self.stdout.write(f"Removed {removed} availability rows.")
@@ -0,0 +1,20 @@
+"""
+Management command running queued background tasks.
+"""
+from django.core.management.base import BaseCommand
+
+from scheduler.meeting_scheduler.background import drain
+
+
+class Command(BaseCommand):
+    help = "Run all due background tasks left in the queue."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--stale-after", type=int, default=None,
+            help="Requeue tasks running for longer than this many seconds.",
+        )
+
+    def handle(self, *args, stale_after, **options):
+        executed = drain(stale_after=stale_after)
+        self.stdout.write(f"Executed {executed} background tasks.")
@@ -0,0 +1,135 @@
+"""
+Management command generating a large synthetic dataset for scale testing.
+"""
+import random
+import re
+from datetime import date, datetime, time, timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from scheduler.meeting_scheduler.models import Availability, Booking, UserModel
+
+FIRST_NAMES = ("Alice", "Bilal", "Chen", "Dana", "Emeka", "Fatima", "Gustav", "Hana", "Ivan", "Julia")
+LAST_NAMES = ("Ahmed", "Brown", "Costa", "Dubois", "Evans", "Fischer", "Garcia", "Haddad", "Ito", "Jones")
+# Meeting intervals are weighted towards short meetings.
+INTERVAL_WEIGHTS = {'15': 5, '30': 4, '45': 1}
+# (earliest start, latest end) hours of the morning & afternoon availability windows.
+DAY_BLOCKS = ((8, 12), (13, 18))
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _quarter(rng, first_hour, last_hour):
+    """Returns a random 15 minutes aligned time between the hours."""
+    minutes = rng.randrange(first_hour * 4, last_hour * 4) * 15
+    return time(hour=minutes // 60, minute=minutes % 60)
+
+
+def generate_user_rows(rng, user_id, first_date, days):
+    """
+    Yields the availabilities and bookings of one user.
+
+    Every user gets a popularity drawn from a long tailed distribution which sets the
+    share of its slots that are booked. Bookings use the window's interval and never
+    touch each other, so they are valid non-overlapping bookings.
+    """
+    intervals = [interval for interval, _ in settings.INTERVAL_CHOICES]
+    interval = rng.choices(intervals, weights=[INTERVAL_WEIGHTS.get(choice, 1) for choice in intervals])[0]
+    step = timedelta(minutes=int(interval))
+    booked_share = min(0.9, 0.08 * rng.paretovariate(1.5))
+
+    for day in range(days):
+        target_date = first_date + timedelta(days=day)
+        if rng.random() > (0.85 if target_date.weekday() < 5 else 0.1):
+            continue
+        for first_hour, last_hour in DAY_BLOCKS:
+            if rng.random() < 0.3:
+                continue
+            window_start = datetime.combine(target_date, _quarter(rng, first_hour, first_hour + 2))
+            window_end = datetime.combine(target_date, _quarter(rng, last_hour - 2, last_hour)) + timedelta(minutes=15)
+            yield Availability(
+                user_id=user_id, from_time=window_start, to_time=window_end, interval_mints=interval,
+            )
+
+            slot = window_start
+            while slot + step <= window_end:
+                if rng.random() < booked_share:
+                    first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+                    yield Booking(
+                        user_id=user_id,
+                        full_name=f'{first_name} {last_name}',
+                        email=f'{first_name}.{last_name}{rng.randrange(1000)}@example.com'.lower(),
+                        date=target_date,
+                        start_time=slot.time(),
+                        end_time=(slot + step).time(),
+                        total_time=int(interval),
+                    )
+                    # Keep a slot free, touching bookings count as overlapping.
+                    slot += step
+                slot += step
+
+
+class Command(BaseCommand):
+    help = "Generate users, availabilities and non-overlapping bookings, deterministic by seed."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000, help="Number of users to generate.")
+        parser.add_argument("--days", type=int, default=30, help="Number of days of availability per user.")
+        parser.add_argument("--start-date", type=date.fromisoformat, default=None, help="First day, defaults to today.")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed, same seed generates the same data.")
+        parser.add_argument("--chunk-size", type=int, default=5000, help="Rows per bulk insert.")
+        parser.add_argument("--prefix", default="synthetic", help="Username prefix of the generated users.")
+
+    def handle(self, *args, users, days, start_date, seed, chunk_size, prefix, **options):
+        first_date = start_date or date.today()
+        password = make_password(f'{prefix}-password')
+
+        with transaction.atomic():
+            # Continue the numbering of previous runs so usernames stay unique.
+            last_username = UserModel.objects.filter(
+                username__regex=rf'^{re.escape(prefix)}-[0-9]{{7}}$'
+            ).order_by('-username').values_list('username', flat=True).first()
+            first_number = int(last_username.rsplit('-', 1)[1]) + 1 if last_username else 0
+            usernames = [f'{prefix}-{number:07d}' for number in range(first_number, first_number + users)]
+
+            user_ids = []
+            for chunk in _chunks(usernames, chunk_size):
+                # The database assigns the ids, they are read back as SQLite does not return them.
+                UserModel.objects.bulk_create(
+                    UserModel(username=username, email=f'{username}@example.com', password=password)
+                    for username in chunk
+                )
+                user_ids += UserModel.objects.filter(
+                    username__range=(chunk[0], chunk[-1])
+                ).order_by('username').values_list('pk', flat=True)
+
+            counts = {Availability: 0, Booking: 0}
+            rows = (
+                row
+                for index, user_id in enumerate(user_ids)
+                for row in generate_user_rows(random.Random(f'{seed}-{index}'), user_id, first_date, days)
+            )
+            for chunk in _chunks(rows, chunk_size):
+                for model in (Availability, Booking):
+                    instances = [row for row in chunk if isinstance(row, model)]
+                    model.objects.bulk_create(instances, batch_size=chunk_size)
+                    counts[model] += len(instances)
+                self.stdout.write(
+                    f"{counts[Availability]} availabilities, {counts[Booking]} bookings...", ending="\r"
+                )
+
+        self.stdout.write(
+            f"Generated {users} users, {counts[Availability]} availabilities and {counts[Booking]} bookings."
+        )
+        self.stdout.write("Run `python manage.py rebuild_utilization` to refresh the daily utilization table.")
@@ -0,0 +1,35 @@
+"""
+Management command listing and aggregating captured GraphQL profiles.
+"""
+import pstats
+
+from django.core.management.base import BaseCommand, CommandError
+
+from scheduler.api.profiling import list_profiles, make_token, summarize
+
+
+class Command(BaseCommand):
+    help = "List captured GraphQL operation profiles or aggregate them into one top-N summary."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--operation", default=None, help="Only use profiles of this operation name.")
+        parser.add_argument("--aggregate", action="store_true", help="Print the summary of all matching profiles.")
+        parser.add_argument("--limit", type=int, default=None, help="Number of functions in the summary.")
+        parser.add_argument("--token", action="store_true", help="Print a value for the X-GraphQL-Profile header.")
+
+    def handle(self, *args, operation, aggregate, limit, token, **options):
+        if token:
+            self.stdout.write(make_token())
+            return
+
+        profiles = list_profiles(operation)
+        if not aggregate:
+            for operation_name, path in profiles:
+                self.stdout.write(f"{operation_name}\t{path}")
+            return
+
+        if not profiles:
+            raise CommandError("No captured profiles found.")
+        stats = pstats.Stats(*[path for _, path in profiles])
+        self.stdout.write(f"Aggregated {len(profiles)} profiles.")
+        self.stdout.write(summarize(stats, limit))
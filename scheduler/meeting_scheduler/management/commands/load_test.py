@@ -0,0 +1,375 @@
+"""
+Management command replaying a weighted mix of GraphQL operations from concurrent clients.
+
+The app runs in-process on a temporary database by default. With `--url` the
+operations are sent to a local server instead, which must use the configured
+database since the hosts and their availabilities are created there.
+"""
+import json
+import logging
+import random
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import date, datetime, time as day_time, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client, override_settings
+
+from scheduler.meeting_scheduler.models import Availability, BackgroundTask, Booking, UserModel
+
+HOST_PREFIX = 'loadtest-host'
+PASSWORD = 'loadtest-password'
+DEFAULT_MIX = 'login=1,bookings=4,availabilities=2,createBooking=3'
+# Bookings are made between these hours, inside the hosts' availability.
+FIRST_HOUR, LAST_HOUR = 8, 18
+# Business errors expected when clients compete for the same slots.
+REJECTIONS = ('overlapping with other bookings', 'no availability', 'on hold')
+
+LOGIN = '''
+    mutation login($username: String!, $password: String!) {
+      login(username: $username, password: $password) { success token }
+    }
+'''
+BOOKINGS = '''
+    query bookings($username: String!, $from: Date!, $to: Date!) {
+      bookings(username: $username, dateFrom: $from, dateTo: $to, first: 50) {
+        edges { node { id startTime endTime } }
+      }
+    }
+'''
+AVAILABILITIES = '''
+    query availabilities { availabilities(first: 50) { edges { node { id fromTime toTime } } } }
+'''
+CREATE_BOOKING = '''
+    mutation createBooking($username: String!, $date: Date!, $time: Time!, $minutes: Int!) {
+      createBooking(
+        username: $username, fullName: "Load Test", email: "load-test@example.com",
+        targetDate: $date, targetTime: $time, totalTime: $minutes
+      ) { success booking { id } }
+    }
+'''
+
+
+def parse_mix(mix):
+    """Parses `name=weight,...` into {operation: weight}."""
+    weights = {}
+    for item in mix.split(','):
+        name, _, weight = item.partition('=')
+        if name.strip() not in OPERATIONS:
+            raise CommandError(f"Unknown operation {name.strip()!r}, choose from {', '.join(OPERATIONS)}.")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+def create_hosts(hosts, first_date, days):
+    """Creates the hosts with a working day of availability on each date, returns their usernames."""
+    password = make_password(PASSWORD)
+    usernames = []
+    for index in range(hosts):
+        username = f'{HOST_PREFIX}-{index:04d}'
+        user, _ = UserModel.objects.get_or_create(
+            username=username, defaults={'email': f'{username}@example.com', 'password': password}
+        )
+        for day in range(days):
+            target_date = first_date + timedelta(days=day)
+            Availability.objects.get_or_create(
+                user=user,
+                from_time=datetime.combine(target_date, day_time(hour=FIRST_HOUR)),
+                to_time=datetime.combine(target_date, day_time(hour=LAST_HOUR)),
+                defaults={'interval_mints': '15'},
+            )
+        usernames.append(username)
+    return usernames
+
+
+def find_double_bookings(bookings):
+    """
+    Returns the pairs of overlapping bookings of the same host and date, bookings
+    sharing a boundary minute overlap like in `Booking.is_overlapping_booking`.
+    Arguments:
+        bookings: iterable of (id, user_id, date, start_time, end_time).
+    """
+    days = defaultdict(list)
+    for booking_id, user_id, target_date, start_time, end_time in bookings:
+        days[(user_id, target_date)].append((start_time, end_time, booking_id))
+
+    overlapping = []
+    for day in days.values():
+        day.sort()
+        latest_end, latest_id = None, None
+        for start_time, end_time, booking_id in day:
+            if latest_end is not None and start_time <= latest_end:
+                overlapping.append((latest_id, booking_id))
+            if latest_end is None or end_time > latest_end:
+                latest_end, latest_id = end_time, booking_id
+    return overlapping
+
+
+class InProcessTransport:
+    """Sends operations through the Django test client, the whole stack runs in this process."""
+
+    def __init__(self):
+        self.client = Client()
+
+    def post(self, body, token=None):
+        headers = {'HTTP_AUTHORIZATION': f'JWT {token}'} if token else {}
+        response = self.client.post('/api/graphql', json.dumps(body), content_type='application/json', **headers)
+        return response.status_code, response.json() if response.status_code == 200 else None
+
+
+class HTTPTransport:
+    """Sends operations to a running server."""
+
+    def __init__(self, url):
+        self.url = url
+
+    def post(self, body, token=None):
+        headers = {'Content-Type': 'application/json'}
+        if token:
+            headers['Authorization'] = f'JWT {token}'
+        request = urllib.request.Request(self.url, json.dumps(body).encode(), headers)
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as error:
+            return error.code, None
+
+
+def _login(client):
+    variables = {'username': client['username'], 'password': PASSWORD}
+    return LOGIN, variables, None
+
+
+def _bookings(client, rng, scenario):
+    target_date = rng.choice(scenario['dates'])
+    variables = {'username': rng.choice(scenario['hosts']), 'from': str(target_date), 'to': str(target_date)}
+    return BOOKINGS, variables, None
+
+
+def _availabilities(client):
+    return AVAILABILITIES, {}, client['token']
+
+
+def _create_booking(client, rng, scenario):
+    # Zipf weighted hosts, the first ones get most of the bookings.
+    host = rng.choices(scenario['hosts'], weights=scenario['popularity'])[0]
+    minutes = rng.choice((15, 30))
+    start = rng.randrange(FIRST_HOUR * 60, LAST_HOUR * 60 - minutes, 15)
+    variables = {
+        'username': host,
+        'date': str(rng.choice(scenario['dates'])),
+        'time': f'{start // 60:02d}:{start % 60:02d}',
+        'minutes': minutes,
+    }
+    return CREATE_BOOKING, variables, None
+
+
+# Request builders, called with (client, rng, scenario).
+OPERATIONS = {
+    'login': lambda client, rng, scenario: _login(client),
+    'bookings': _bookings,
+    'availabilities': lambda client, rng, scenario: _availabilities(client),
+    'createBooking': _create_booking,
+}
+
+
+def classify(status, payload):
+    """Returns the (outcome, message) of a response, outcome being ok, rejected or error."""
+    if status != 200 or payload is None:
+        return 'error', f'HTTP {status}'
+    errors = payload.get('errors')
+    if not errors:
+        return 'ok', None
+    message = errors[0].get('message', '')
+    if any(rejection in message for rejection in REJECTIONS):
+        return 'rejected', message
+    return 'error', message
+
+
+def _new_stats():
+    return {'ok': 0, 'rejected': 0, 'error': 0, 'latencies': []}
+
+
+def run_clients(transport_factory, scenario, mix, clients=8, seconds=10.0, seed=0):
+    """
+    Runs concurrent clients sending operations picked from the weighted mix until the
+    deadline. Every client logs in as one of the hosts first.
+    Returns:
+        dict: {operation: {outcome: count, 'latencies': [...]}}, error messages & elapsed seconds.
+    """
+    names, weights = list(mix), list(mix.values())
+    results = defaultdict(_new_stats)
+    messages = Counter()
+    lock = threading.Lock()
+
+    def send(transport, client, name, rng, local):
+        query, variables, token = OPERATIONS[name](client, rng, scenario)
+        started = time.perf_counter()
+        try:
+            status, payload = transport.post({'query': query, 'variables': variables}, token=token)
+            outcome, message = classify(status, payload)
+        except Exception as error:  # pylint: disable=broad-except
+            payload, outcome, message = None, 'error', f'{type(error).__name__}: {error}'
+        latency = time.perf_counter() - started
+        stats = local['results'][name]
+        stats[outcome] += 1
+        stats['latencies'].append(latency)
+        if outcome != 'ok' and message:
+            local['messages'][(name, message[:100])] += 1
+        return payload
+
+    def worker(index, deadline):
+        rng = random.Random(f'{seed}-{index}')
+        transport = transport_factory()
+        local = {'results': defaultdict(_new_stats), 'messages': Counter()}
+        client = {'username': scenario['hosts'][index % len(scenario['hosts'])], 'token': None}
+        try:
+            payload = send(transport, client, 'login', rng, local)
+            login = ((payload or {}).get('data') or {}).get('login') or {}
+            client['token'] = login.get('token')
+            while time.perf_counter() < deadline:
+                send(transport, client, rng.choices(names, weights=weights)[0], rng, local)
+        finally:
+            connections.close_all()
+        with lock:
+            for name, stats in local['results'].items():
+                for key, value in stats.items():
+                    results[name][key] += value
+            messages.update(local['messages'])
+
+    started = time.perf_counter()
+    deadline = started + seconds
+    threads = [threading.Thread(target=worker, args=(index, deadline)) for index in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {'operations': dict(results), 'messages': messages, 'seconds': time.perf_counter() - started}
+
+
+@contextmanager
+def temporary_database(profile):
+    """Switches the default database to a migrated temporary SQLite file with the profile's settings."""
+    database = settings.PRODUCTION_DATABASE if profile == 'production' else connections.databases['default']
+    previous = connections.databases['default']
+    with tempfile.TemporaryDirectory() as directory:
+        connections['default'].close()
+        del connections['default']
+        connections.databases['default'] = {**database, 'NAME': str(Path(directory) / 'load_test.sqlite3')}
+        try:
+            call_command('migrate', verbosity=0, interactive=False)
+            yield
+        finally:
+            connections.close_all()
+            del connections['default']
+            connections.databases['default'] = previous
+
+
+@contextmanager
+def _quiet_loggers(*names):
+    """Keeps the expected errors & slow queries of the in-process run off the console."""
+    loggers = [logging.getLogger(name) for name in names]
+    levels = [logger.level for logger in loggers]
+    for logger in loggers:
+        logger.setLevel(logging.CRITICAL)
+    try:
+        yield
+    finally:
+        for logger, level in zip(loggers, levels):
+            logger.setLevel(level)
+
+
+def _wait_for_tasks(timeout=30):
+    """Waits for the booking confirmations enqueued during the run to complete."""
+    deadline = time.monotonic() + timeout
+    pending = (BackgroundTask.PENDING, BackgroundTask.RUNNING)
+    while BackgroundTask.objects.filter(status__in=pending).exists() and time.monotonic() < deadline:
+        time.sleep(0.1)
+
+
+def _percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))] if values else 0.0
+
+
+class Command(BaseCommand):
+    help = "Replay a weighted mix of GraphQL operations from concurrent clients and report the results."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--url", help="GraphQL endpoint of a running server, e.g. http://127.0.0.1:8000/api/graphql."
+        )
+        parser.add_argument("--clients", type=int, default=16, help="Number of concurrent clients.")
+        parser.add_argument("--seconds", type=float, default=10.0, help="Duration of the run.")
+        parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Weighted operations, default {DEFAULT_MIX}.")
+        parser.add_argument("--hosts", type=int, default=50, help="Number of hosts clients book meetings with.")
+        parser.add_argument("--days", type=int, default=5, help="Number of days bookable from tomorrow.")
+        parser.add_argument(
+            "--profile", choices=("default", "production"), default="default",
+            help="Database profile of the in-process run.",
+        )
+        parser.add_argument("--seed", default="0", help="Seed of the clients' random choices.")
+
+    def handle(self, *args, url, clients, seconds, mix, hosts, days, profile, seed, **options):
+        mix = parse_mix(mix)
+        if url:
+            self.run(lambda: HTTPTransport(url), mix, clients, seconds, hosts, days, seed)
+            return
+        with temporary_database(profile), _quiet_loggers('graphql', 'scheduler.api.slow_queries'), override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            EMAIL_BACKEND='django.core.mail.backends.dummy.EmailBackend',
+        ):
+            self.run(InProcessTransport, mix, clients, seconds, hosts, days, seed)
+            _wait_for_tasks()
+
+    def run(self, transport_factory, mix, clients, seconds, hosts, days, seed):
+        first_date = date.today() + timedelta(days=1)
+        usernames = create_hosts(hosts, first_date, days)
+        scenario = {
+            'hosts': usernames,
+            'popularity': [1 / (rank + 1) for rank in range(len(usernames))],
+            'dates': [first_date + timedelta(days=day) for day in range(days)],
+        }
+        started_at = datetime.now()
+        results = run_clients(transport_factory, scenario, mix, clients=clients, seconds=seconds, seed=seed)
+        self.report(results)
+
+        bookings = list(Booking.objects.filter(
+            user__username__startswith=HOST_PREFIX, date__gte=first_date
+        ).values_list('id', 'user_id', 'date', 'start_time', 'end_time', 'created_at'))
+        created = sum(1 for *_, created_at in bookings if created_at >= started_at)
+        double_bookings = find_double_bookings(booking[:5] for booking in bookings)
+        self.stdout.write(f"\nBookings created: {created}, double bookings: {len(double_bookings)}")
+        for first, second in double_bookings[:10]:
+            self.stdout.write(f"  bookings {first} & {second} overlap")
+
+    def report(self, results):
+        operations, elapsed = results['operations'], results['seconds']
+        total = sum(len(stats['latencies']) for stats in operations.values())
+        errors = sum(stats['error'] for stats in operations.values())
+        self.stdout.write(
+            f"{'operation':<16}{'requests':>10}{'ok':>8}{'rejected':>10}{'errors':>8}"
+            f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+        )
+        for name, stats in sorted(operations.items()):
+            latencies = stats['latencies']
+            self.stdout.write(
+                f"{name:<16}{len(latencies):>10}{stats['ok']:>8}{stats['rejected']:>10}{stats['error']:>8}"
+                + "".join(f"{_percentile(latencies, share) * 1000:>10.1f}" for share in (0.5, 0.95, 0.99))
+            )
+        self.stdout.write(
+            f"\n{total} requests in {elapsed:.1f} s: {total / elapsed:.0f} requests/s, "
+            f"error rate {errors / max(total, 1):.2%}"
+        )
+        for (name, message), count in results['messages'].most_common(5):
+            self.stdout.write(f"  {count} x {name}: {message}")
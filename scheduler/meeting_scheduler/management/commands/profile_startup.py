@@ -0,0 +1,77 @@
+"""
+Management command reporting worker startup cost.
+"""
+import json
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter so that nothing is already imported.
+STARTUP_SCRIPT = """
+import json, os, time
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "scheduler.settings")
+started = time.perf_counter()
+import django
+django.setup()
+import scheduler.urls
+ready = time.perf_counter()
+from scheduler.api.schema import get_schema
+get_schema()
+built = time.perf_counter()
+print(json.dumps({"setup": ready - started, "schema": built - ready}))
+"""
+
+
+def profile_startup():
+    """
+    Profile a cold worker start in a subprocess.
+
+    Returns:
+        (timings, modules): `timings` holds the seconds spent in `django.setup()` plus the URL
+        configuration import (`setup`) and in building the schema (`schema`). `modules` is a
+        list of (module, self_us, cumulative_us) tuples parsed from `python -X importtime`.
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", STARTUP_SCRIPT],
+        cwd=str(settings.BASE_DIR),
+        capture_output=True,
+        text=True,
+    )
+    if process.returncode:
+        raise CommandError(process.stderr)
+
+    modules = []
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        if self_us.strip().isdigit():
+            modules.append((module.strip(), int(self_us), int(cumulative_us)))
+
+    return json.loads(process.stdout.strip().splitlines()[-1]), modules
+
+
+class Command(BaseCommand):
+    help = "Report import time per module and schema build time of a cold worker start."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=20, help="Number of modules to report.")
+        parser.add_argument("--prefix", default="", help="Only report modules starting with this prefix.")
+
+    def handle(self, *args, limit, prefix, **options):
+        timings, modules = profile_startup()
+        modules = sorted(
+            (module for module in modules if module[0].startswith(prefix)),
+            key=lambda module: module[2],
+            reverse=True,
+        )
+
+        self.stdout.write(f"{'cumulative ms':>14} {'self ms':>9}  module")
+        for module, self_us, cumulative_us in modules[:limit]:
+            self.stdout.write(f"{cumulative_us / 1000:14.1f} {self_us / 1000:9.1f}  {module}")
+
+        self.stdout.write("")
+        self.stdout.write(f"django setup + urls: {timings['setup'] * 1000:.1f} ms")
+        self.stdout.write(f"schema build:        {timings['schema'] * 1000:.1f} ms")
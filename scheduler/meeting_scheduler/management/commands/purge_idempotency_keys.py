@@ -0,0 +1,15 @@
+"""
+Management command deleting expired idempotency keys.
+"""
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from scheduler.meeting_scheduler.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = "Delete all expired idempotency keys in bulk."
+
+    def handle(self, *args, **options):
+        deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+        self.stdout.write(f"Deleted {deleted} expired idempotency keys.")
@@ -0,0 +1,14 @@
+"""
+Management command deleting expired slot holds.
+"""
+from django.core.management.base import BaseCommand
+
+from scheduler.meeting_scheduler.models import SlotHold
+
+
+class Command(BaseCommand):
+    help = "Delete all expired slot holds in bulk."
+
+    def handle(self, *args, **options):
+        deleted, _ = SlotHold.objects.expired().delete()
+        self.stdout.write(f"Deleted {deleted} expired slot holds.")
@@ -0,0 +1,19 @@
+"""
+Management command rebuilding the daily utilization table.
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from scheduler.meeting_scheduler.utilization import rebuild_utilization
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-user daily utilization table from bookings and availabilities."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Rows per bulk insert.")
+
+    def handle(self, *args, batch_size, **options):
+        with transaction.atomic():
+            rows = rebuild_utilization(batch_size=batch_size)
+        self.stdout.write(f"Rebuilt {rows} daily utilization rows.")
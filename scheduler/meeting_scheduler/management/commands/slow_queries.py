@@ -0,0 +1,36 @@
+"""
+Management command aggregating the slow-query log.
+"""
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from scheduler.api.slow_queries import aggregate
+
+
+class Command(BaseCommand):
+    help = "Aggregate logged slow queries by normalized SQL fingerprint."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=10, help="Number of fingerprints to report.")
+        parser.add_argument("--file", default=None, help="Slow-query log file, defaults to SLOW_QUERY_LOG['FILE'].")
+
+    def handle(self, *args, limit, file, **options):
+        path = file or settings.SLOW_QUERY_LOG["FILE"]
+        try:
+            with open(path) as log_file:
+                records = [json.loads(line) for line in log_file if line.strip()]
+        except FileNotFoundError:
+            raise CommandError(f"No slow-query log at {path}.")
+
+        for group in aggregate(records)[:limit]:
+            self.stdout.write(
+                f"{group['fingerprint']}  count={group['count']}  total={group['total_ms']:.1f}ms  "
+                f"max={group['max_ms']:.1f}ms"
+            )
+            self.stdout.write(f"  operations: {', '.join(sorted(group['operations']))}")
+            self.stdout.write(f"  resolvers: {', '.join(sorted(group['resolvers']))}")
+            self.stdout.write(f"  sql: {group['sql']}")
+            for row in group['plan'] or []:
+                self.stdout.write(f"  plan: {row}")
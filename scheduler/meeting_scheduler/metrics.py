@@ -0,0 +1,169 @@
+"""
+Prometheus-style metrics for scheduler app.
+
+Counters & histograms are aggregated in process memory, each worker process
+flushes its totals every `METRICS["FLUSH_INTERVAL_SECONDS"]` to its own JSON file
+in `METRICS["DIRECTORY"]`. The metrics endpoint merges the files of all worker
+processes and renders them in the Prometheus text format. Files not written for
+`METRICS["STALE_AFTER_SECONDS"]`, left behind by exited workers, are deleted when
+collecting, Prometheus sees their counters drop as a counter reset.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from pathlib import Path
+
+from django.conf import settings
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# name: (type, help, histogram buckets)
+METRICS = {
+    "graphql_request_duration_seconds": ("histogram", "GraphQL operation latency.", DURATION_BUCKETS),
+    "graphql_request_db_queries": ("histogram", "Database queries issued per GraphQL operation.", QUERY_BUCKETS),
+    "graphql_errors_total": ("counter", "GraphQL errors by operation and error type.", None),
+    "booking_validations_total": ("counter", "Booking validation outcomes.", None),
+    "cache_requests_total": ("counter", "Cache lookups by cache and result (hit or miss).", None),
+}
+
+_lock = threading.Lock()
+# {(name, labels): value} and {(name, labels): [bucket counts..., +Inf count, sum]}
+_counters = {}
+_histograms = {}
+_process = {"id": None, "flushed_at": 0.0}
+
+
+def _reset():
+    """Starts an empty registry with a new process file, e.g. in forked workers."""
+    _counters.clear()
+    _histograms.clear()
+    _process.update(id=f"{os.getpid()}-{uuid.uuid4().hex[:8]}", flushed_at=time.monotonic())
+
+
+_reset()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset)
+
+
+def _key(name, labels):
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def inc(name, value=1, **labels):
+    """Increments the counter with the labels."""
+    if not settings.METRICS["ENABLED"]:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, value, **labels):
+    """Records a value in the histogram with the labels."""
+    if not settings.METRICS["ENABLED"]:
+        return
+    buckets = METRICS[name][2]
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [0] * (len(buckets) + 2)
+        histogram[bisect_left(buckets, value)] += 1
+        histogram[-1] += value
+
+
+def process_file():
+    """Returns the metrics file of the current process."""
+    return Path(settings.METRICS["DIRECTORY"]) / f"{_process['id']}.json"
+
+
+def flush(force=True):
+    """Writes the totals of the process to its file, at most once per flush interval unless forced."""
+    now = time.monotonic()
+    if not force and now - _process["flushed_at"] < settings.METRICS["FLUSH_INTERVAL_SECONDS"]:
+        return
+    with _lock:
+        _process["flushed_at"] = now
+        data = {
+            "counters": [[name, labels, value] for (name, labels), value in _counters.items()],
+            "histograms": [[name, labels, values] for (name, labels), values in _histograms.items()],
+        }
+    path = process_file()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_suffix(".tmp")
+    temporary.write_text(json.dumps(data))
+    os.replace(temporary, path)
+
+
+@atexit.register
+def _flush_at_exit():
+    if settings.METRICS["ENABLED"] and (_counters or _histograms):
+        try:
+            flush()
+        except Exception:  # pylint: disable=broad-except
+            pass
+
+
+def collect():
+    """Returns the ({key: value}, {key: values}) totals of all the worker processes."""
+    flush()
+    counters, histograms = {}, {}
+    stale_before = time.time() - settings.METRICS["STALE_AFTER_SECONDS"]
+    for path in Path(settings.METRICS["DIRECTORY"]).glob("*.json"):
+        try:
+            if path.stat().st_mtime < stale_before:
+                path.unlink()
+                continue
+            data = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        for name, labels, value in data["counters"]:
+            key = name, tuple(map(tuple, labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, values in data["histograms"]:
+            key = name, tuple(map(tuple, labels))
+            current = histograms.get(key)
+            histograms[key] = values if current is None else [a + b for a, b in zip(current, values)]
+    return counters, histograms
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (key, value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")) for key, value in labels
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """Returns the metrics of all the worker processes in the Prometheus text format."""
+    counters, histograms = collect()
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        if kind == "counter":
+            lines += [
+                f"{name}{_format_labels(labels)} {_format_value(value)}"
+                for (metric, labels), value in sorted(counters.items()) if metric == name
+            ]
+            continue
+        for (metric, labels), values in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets + ("+Inf",), values[:-1]):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', str(bound)),))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(values[-1])}")
+            lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,21 @@
+# Generated by Django 3.1.14 on 2026-10-19 19:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meeting_scheduler', '0004_backgroundtask'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='availability',
+            index=models.Index(fields=['user', 'to_time'], name='meeting_sch_user_id_8f0962_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['user', 'date', 'start_time'], name='meeting_sch_user_id_b52a84_idx'),
+        ),
+    ]
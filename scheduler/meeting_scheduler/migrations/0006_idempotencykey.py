@@ -0,0 +1,28 @@
+# Generated by Django 3.1.14 on 2026-10-19 19:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meeting_scheduler', '0005_booking_availability_range_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(help_text='Name of the mutation the key was used with.', max_length=64)),
+                ('key', models.CharField(max_length=255)),
+                ('request_hash', models.CharField(help_text='Hash of the mutation arguments.', max_length=64)),
+                ('response', models.TextField(help_text='Serialized instance returned by the mutation.')),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'unique_together': {('scope', 'key')},
+            },
+        ),
+    ]
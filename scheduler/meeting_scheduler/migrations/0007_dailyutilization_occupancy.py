@@ -0,0 +1,23 @@
+# Generated by Django 3.1.14 on 2026-10-19 19:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meeting_scheduler', '0006_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailyutilization',
+            name='available_slots',
+            field=models.BinaryField(default=b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00', max_length=12),
+        ),
+        migrations.AddField(
+            model_name='dailyutilization',
+            name='booked_slots',
+            field=models.BinaryField(default=b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00', max_length=12),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.1.14 on 2026-10-19 19:46
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meeting_scheduler', '0007_dailyutilization_occupancy'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='user',
+            field=models.ForeignKey(blank=True, help_text='Authenticated caller who used the key.', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterUniqueTogether(
+            name='idempotencykey',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='idempotencykey',
+            constraint=models.UniqueConstraint(condition=models.Q(user__isnull=False), fields=('scope', 'user', 'key'), name='idempotency_key_per_user'),
+        ),
+        migrations.AddConstraint(
+            model_name='idempotencykey',
+            constraint=models.UniqueConstraint(condition=models.Q(user__isnull=True), fields=('scope', 'key'), name='idempotency_key_anonymous'),
+        ),
+    ]
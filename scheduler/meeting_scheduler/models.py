@@ -1,9 +1,37 @@
+import hashlib
+import json
+import uuid
 from datetime import datetime, timedelta
 
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.core import serializers
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
 from django.db.models import Q
+from django.utils import timezone
+
+from . import metrics, occupancy
+
+
+def overlapping_slot_filter(start_time, end_time):
+    """Returns a filter matching start/end time ranges overlapping the provided range."""
+    return (
+        Q(start_time__range=[start_time, end_time]) | Q(end_time__range=[start_time, end_time])
+        # Meeting time is a subset.
+        | (Q(start_time__lte=start_time) & Q(end_time__gte=end_time))
+    )
+
+
+def lock_user(user):
+    """
+    Serializes the slot writes of the user until the end of the current transaction.
+
+    The user row is locked on databases supporting `SELECT ... FOR UPDATE`, SQLite takes
+    its write lock as the transaction begins with the `IMMEDIATE` transaction mode of the
+    production profile, see `scheduler/sqlite3/base.py`.
+    """
+    list(UserModel.objects.select_for_update().filter(pk=user.pk).values_list('pk'))
 
 
 class UserModel(AbstractUser):
@@ -34,6 +62,8 @@ class Availability(models.Model):
 
     class Meta:
         unique_together = ('user', 'from_time', 'to_time')
+        # (user, from_time) lookups use the unique together index.
+        indexes = [models.Index(fields=['user', 'to_time'])]
 
     @staticmethod
     def user_has_availability(user, target_date, start_time, end_time):
@@ -52,6 +82,38 @@ class Availability(models.Model):
             Q(from_time__lte=target_start_datetime) | Q(to_time__gte=target_end_datetime)
         ).count()
 
+    def coalesce(self, update_fields=None):
+        """
+        Merges user's overlapping & adjacent windows with the same interval into this one.
+
+        The merged windows are deleted and this availability is saved spanning all of
+        them, in one transaction.
+        Arguments:
+            update_fields: fields to save when updating an existing availability, the
+                time range is saved as well when windows were merged.
+        Returns:
+            int: number of merged rows removed.
+        """
+        removed = 0
+        with transaction.atomic():
+            while self.from_time < self.to_time:
+                neighbours = list(Availability.objects.filter(
+                    user=self.user,
+                    interval_mints=self.interval_mints,
+                    from_time__lte=self.to_time,
+                    to_time__gte=self.from_time,
+                ).exclude(pk=self.pk))
+                if not neighbours:
+                    break
+                self.from_time = min([self.from_time] + [neighbour.from_time for neighbour in neighbours])
+                self.to_time = max([self.to_time] + [neighbour.to_time for neighbour in neighbours])
+                Availability.objects.filter(pk__in=[neighbour.pk for neighbour in neighbours]).delete()
+                removed += len(neighbours)
+            if removed and update_fields is not None:
+                update_fields = set(update_fields) | {'from_time', 'to_time'}
+            self.save(update_fields=update_fields if self.pk else None)
+        return removed
+
 
 class Booking(models.Model):
     """
@@ -76,6 +138,9 @@ class Booking(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, editable=False)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['user', 'date', 'start_time'])]
+
     # def validate_if_booking_has_already_exists(self):
     #     """
     #     Checks weather a booking for user already exists or not.
@@ -83,16 +148,21 @@ class Booking(models.Model):
     #     """
     #     return Booking.objects.filter(user=self.user, date=self.date, start_time=self.start_time).exists()
 
-    def is_valid_new_booking(self):
+    def is_valid_new_booking(self, hold_token=None):
         """
         Validates booking object before trying to save.
 
+        Not held:
+            Fails fast if another client holds an overlapping slot. A hold matching
+            `hold_token` belongs to the caller and is ignored, it must cover the slot.
         Not already booked:
             The method tries to validate if the booking has already been done or its
             available for booking.
         User has availability:
             Checks if user has available in the provided booking slot.
 
+        Arguments:
+            hold_token: token of the caller's own hold on this slot, if any.
         Returns:
             boolean(True): if all validations pass
         Raises:
@@ -101,33 +171,62 @@ class Booking(models.Model):
         if not self.end_time:
             self.end_time = self._end_time()
 
+        if hold_token and not SlotHold.objects.covering(self).filter(token=hold_token).exists():
+            raise ValueError('The hold token does not cover this slot.')
+
+        if SlotHold.objects.is_held(self.user, self.date, self.start_time, self.end_time, exclude_token=hold_token):
+            metrics.inc('booking_validations_total', outcome='held')
+            raise ValueError(f'{self.user.username} has this slot on hold by another booking.')
+
         # already_booked = self.validate_if_booking_has_already_exists()
         # if already_booked:
         #     raise ValueError(f'{self.user.username} has already been booked for {self.start_time}')
 
-        has_availability = Availability.user_has_availability(
+        # The day bitmap only spares the availability query when the slot is marked
+        # available, overlaps are always decided by the SQL check below.
+        available_slots = self._day_available_slots()
+        covered = occupancy.covered_mask(self.start_time, self.end_time)
+
+        decided = available_slots & covered == covered
+        metrics.inc('cache_requests_total', cache='occupancy', result='hit' if decided else 'miss')
+
+        has_availability = decided or Availability.user_has_availability(
             user=self.user,
             target_date=self.date,
             start_time=self.start_time,
             end_time=self.end_time,
         )
         if not has_availability:
+            metrics.inc('booking_validations_total', outcome='no_availability')
             raise ValueError(f'{self.user.username} has no availability in this slot.')
 
-        is_overlapping_booking = self.is_overlapping_booking()
-        if is_overlapping_booking:
+        if self.is_overlapping_booking():
+            metrics.inc('booking_validations_total', outcome='overlap')
             raise ValueError(
                 f'Cannot book slot with {self.user.username} The slot is overlapping with other bookings.'
             )
+        metrics.inc('booking_validations_total', outcome='success')
         return True
 
+    def _day_available_slots(self):
+        """
+        Returns the available bitmap of the user's day.
+
+        Bitmaps which cannot be trusted (no summary row, a slot crossing midnight)
+        are returned as nothing available.
+        """
+        row = DailyUtilization.objects.filter(user=self.user, date=self.date).values_list(
+            'available_slots', flat=True
+        ).first()
+        if row is None or self.end_time <= self.start_time:
+            return 0
+        return occupancy.from_bytes(row)
+
     def is_overlapping_booking(self):
         return Booking.objects.filter(
             Q(user=self.user) &
             Q(date=self.date),
-            Q(start_time__range=[self.start_time, self.end_time]) | Q(end_time__range=[self.start_time, self.end_time])
-            # Meeting time is a subset.
-            | (Q(start_time__lte=self.start_time) & Q(end_time__gte=self.end_time))
+            overlapping_slot_filter(self.start_time, self.end_time)
         ).exists()
 
     def _end_time(self):
@@ -140,3 +239,220 @@ class Booking(models.Model):
         if not self.end_time:
             self.end_time = self._end_time()
         return super().save(*args, **kwargs)
+
+
+class SlotHoldQuerySet(models.QuerySet):
+    """Slot hold queryset."""
+
+    def active(self):
+        """Holds which have not expired yet."""
+        return self.filter(expires_at__gt=timezone.now())
+
+    def expired(self):
+        """Holds which have expired and can be cleaned up."""
+        return self.filter(expires_at__lte=timezone.now())
+
+    def covering(self, booking):
+        """Holds of the booking's user & date whose slot covers the booking's slot."""
+        return self.filter(
+            user=booking.user,
+            date=booking.date,
+            start_time__lte=booking.start_time,
+            end_time__gte=booking.end_time,
+        )
+
+    def is_held(self, user, target_date, start_time, end_time, exclude_token=None):
+        """Checks if an active hold overlaps the provided slot of the user."""
+        holds = self.active().filter(
+            Q(user=user) & Q(date=target_date),
+            overlapping_slot_filter(start_time, end_time),
+        )
+        if exclude_token:
+            holds = holds.exclude(token=exclude_token)
+        return holds.exists()
+
+
+class SlotHold(models.Model):
+    """
+    Short-lived hold placed on a user's slot while a client completes its booking.
+    """
+    user = models.ForeignKey(
+        UserModel,
+        on_delete=models.CASCADE,
+        related_name="user_slot_holds",
+    )
+    token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+
+    date = models.DateField()
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    expires_at = models.DateTimeField(db_index=True)
+
+    created_at = models.DateTimeField(auto_now_add=True, editable=False)
+
+    objects = SlotHoldQuerySet.as_manager()
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'date', 'expires_at'])]
+
+    @classmethod
+    def place(cls, booking):
+        """
+        Validates the unsaved booking and places a hold on its slot.
+
+        Expired holds of the same user & date are cleaned up on the way. The check
+        and the insert run in one transaction holding the user's lock, so concurrent
+        clients cannot hold the same slot.
+        Raises:
+            ValueError - in case the booking slot is not valid
+        """
+        with transaction.atomic():
+            lock_user(booking.user)
+            booking.is_valid_new_booking()
+            cls.objects.expired().filter(user=booking.user, date=booking.date).delete()
+            return cls.objects.create(
+                user=booking.user,
+                date=booking.date,
+                start_time=booking.start_time,
+                end_time=booking.end_time,
+                expires_at=timezone.now() + timedelta(seconds=settings.SLOT_HOLD_TTL_SECONDS),
+            )
+
+
+class DailyUtilization(models.Model):
+    """
+    Denormalized per-user daily summary of booked vs available minutes.
+
+    Rows are refreshed on every booking & availability write, see `utilization.py`.
+    """
+    user = models.ForeignKey(
+        UserModel,
+        on_delete=models.CASCADE,
+        related_name="user_daily_utilization",
+    )
+    date = models.DateField()
+    booked_minutes = models.PositiveIntegerField(default=0)
+    available_minutes = models.PositiveIntegerField(default=0)
+    # Day occupancy bitmaps, see `occupancy.py`.
+    available_slots = models.BinaryField(max_length=occupancy.BITMAP_BYTES, default=occupancy.EMPTY_BITMAP)
+    booked_slots = models.BinaryField(max_length=occupancy.BITMAP_BYTES, default=occupancy.EMPTY_BITMAP)
+
+    class Meta:
+        unique_together = ('user', 'date')
+
+    @property
+    def utilization(self):
+        """Ratio of booked to available minutes."""
+        if not self.available_minutes:
+            return 0.0
+        return self.booked_minutes / self.available_minutes
+
+
+class BackgroundTask(models.Model):
+    """
+    Persistent queue entry for work executed outside of the request, see `background.py`.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    name = models.CharField(max_length=255, help_text="Dotted path of the task function.")
+    kwargs = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'run_after'])]
+
+
+class IdempotencyKey(models.Model):
+    """
+    Stored result of a mutation executed with a client provided idempotency key.
+
+    Keys are scoped to the authenticated caller, anonymous callers share one scope where
+    a key only replays a mutation called with the very same arguments.
+    """
+    scope = models.CharField(max_length=64, help_text="Name of the mutation the key was used with.")
+    user = models.ForeignKey(
+        UserModel,
+        on_delete=models.CASCADE,
+        related_name="+",
+        null=True,
+        blank=True,
+        help_text="Authenticated caller who used the key.",
+    )
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64, help_text="Hash of the mutation arguments.")
+    response = models.TextField(help_text="Serialized instance returned by the mutation.")
+    expires_at = models.DateTimeField(db_index=True)
+
+    created_at = models.DateTimeField(auto_now_add=True, editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['scope', 'user', 'key'], condition=Q(user__isnull=False), name='idempotency_key_per_user',
+            ),
+            models.UniqueConstraint(
+                fields=['scope', 'key'], condition=Q(user__isnull=True), name='idempotency_key_anonymous',
+            ),
+        ]
+
+    @staticmethod
+    def hash_arguments(arguments):
+        """Returns a stable hash of the mutation arguments."""
+        return hashlib.sha256(
+            json.dumps(arguments, sort_keys=True, cls=DjangoJSONEncoder).encode()
+        ).hexdigest()
+
+    @staticmethod
+    def _caller(user):
+        """Returns the user the keys are scoped to, None for anonymous callers."""
+        return user if user is not None and user.is_authenticated else None
+
+    @classmethod
+    def lookup(cls, scope, key, arguments, user=None):
+        """
+        Returns the instance stored for the caller's key, None if the key is unknown or expired.
+        Raises:
+            ValueError - in case the key was used with different arguments
+        """
+        stored = cls.objects.filter(
+            scope=scope, user=cls._caller(user), key=key, expires_at__gt=timezone.now()
+        ).first()
+        metrics.inc('cache_requests_total', cache='idempotency', result='miss' if stored is None else 'hit')
+        if stored is None:
+            return None
+        if stored.request_hash != cls.hash_arguments(arguments):
+            raise ValueError('The idempotency key has already been used with different arguments.')
+        return next(serializers.deserialize('json', stored.response)).object
+
+    @classmethod
+    def store(cls, scope, key, arguments, instance, user=None):
+        """
+        Stores the instance returned for the caller's key, replacing its expired entry.
+        Other expired keys are deleted by the `purge_idempotency_keys` command.
+        """
+        now = timezone.now()
+        caller = cls._caller(user)
+        cls.objects.filter(scope=scope, user=caller, key=key, expires_at__lte=now).delete()
+        return cls.objects.create(
+            scope=scope,
+            user=caller,
+            key=key,
+            request_hash=cls.hash_arguments(arguments),
+            response=serializers.serialize('json', [instance]),
+            expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL_SECONDS),
+        )
@@ -3,13 +3,25 @@ Scheduler app mutations
 """
 
 import graphene
+from django.db import IntegrityError, transaction
 from graphql import GraphQLError
+from graphql_auth import mutations
 from graphql_relay import from_global_id
 
+from .background import enqueue
+from .bulk import delete_availabilities, upsert_availabilities
 from .decorators import user_required
 from .enums import Description
-from .models import Booking, UserModel as User, Availability
-from .types import BookingType, AvailabilityType
+from .models import Booking, UserModel as User, Availability, IdempotencyKey, SlotHold, lock_user
+from .tasks import send_booking_confirmation
+from .types import AvailabilityInput, BookingType, AvailabilityType, SlotHoldType, UserNode
+
+# Availability mutation arguments and the model fields they set.
+AVAILABILITY_FIELDS = {
+    "availability_from": "from_time",
+    "availability_to": "to_time",
+    "time_interval_mints": "interval_mints",
+}
 
 
 class CreateBooking(graphene.Mutation):
@@ -30,21 +42,90 @@ class CreateBooking(graphene.Mutation):
         target_date = graphene.Date(description="Provide the booking date", required=True)
         target_time = graphene.Time(description="Provide the booking time", required=True)
         total_time = graphene.Int(description="Provide the meeting interval", required=True)
+        hold_token = graphene.UUID(description="Provide the token of your hold on this slot, if any.")
+        idempotency_key = graphene.String(
+            description="Provide a unique key to safely retry the booking, retries return the original booking."
+        )
 
     @classmethod
-    def mutate(cls, root, info, username, target_date, target_time, **kwargs):
+    def mutate(cls, root, info, username, target_date, target_time, hold_token=None, idempotency_key=None, **kwargs):
         """Mutate operation creating booking for a user in the system."""
+        arguments = dict(username=username, target_date=target_date, target_time=target_time, **kwargs)
+        if idempotency_key:
+            replayed = cls.replay(info, idempotency_key, arguments)
+            if replayed:
+                return replayed
+
         try:
             user = User.objects.get(username=username)
         except User.DoesNotExist:
             raise GraphQLError(f"{username} does not exist.")
 
         booking = Booking(user=user, date=target_date, start_time=target_time, **kwargs)
-        if booking.is_valid_new_booking():
-            booking.save()
+        try:
+            # Validated & saved under the host's lock so concurrent bookings cannot both pass the
+            # checks, the confirmation task commits with the booking and is submitted once committed.
+            with transaction.atomic():
+                lock_user(user)
+                booking.is_valid_new_booking(hold_token=hold_token)
+                booking.save()
+                enqueue(send_booking_confirmation, booking_id=booking.pk)
+                if idempotency_key:
+                    IdempotencyKey.store(
+                        cls.__name__, idempotency_key, arguments, booking, user=getattr(info.context, "user", None)
+                    )
+                if hold_token:
+                    SlotHold.objects.covering(booking).filter(token=hold_token).delete()
+        except (ValueError, IntegrityError):
+            # A concurrent retry may have created the booking this one now overlaps, or stored the key first.
+            replayed = idempotency_key and cls.replay(info, idempotency_key, arguments)
+            if replayed:
+                return replayed
+            raise
+        return CreateBooking(booking=booking, success=True)
+
+    @classmethod
+    def replay(cls, info, idempotency_key, arguments):
+        """Returns the original response of the caller's retried booking, None if the key is new."""
+        try:
+            booking = IdempotencyKey.lookup(
+                cls.__name__, idempotency_key, arguments, user=getattr(info.context, "user", None)
+            )
+        except ValueError as error:
+            raise GraphQLError(str(error))
+        if booking is not None:
             return CreateBooking(booking=booking, success=True)
+        return None
 
-        GraphQLError("Booking information is not valid.")
+
+class HoldSlot(graphene.Mutation):
+    """
+    OTD mutation class for holding a user's slot while the booking is completed.
+    """
+    hold = graphene.Field(SlotHoldType)
+    success = graphene.Boolean()
+
+    class Arguments:
+        """Defines the arguments the mutation can take."""
+        username = graphene.String(description="Provide Username for which the slot is being held.", required=True)
+        target_date = graphene.Date(description="Provide the booking date", required=True)
+        target_time = graphene.Time(description="Provide the booking time", required=True)
+        total_time = graphene.Int(description="Provide the meeting interval", required=True)
+
+    @classmethod
+    def mutate(cls, root, info, username, target_date, target_time, total_time):
+        """Mutate operation placing a temporary hold on a user's slot."""
+        try:
+            user = User.objects.get(username=username)
+        except User.DoesNotExist:
+            raise GraphQLError(f"{username} does not exist.")
+
+        booking = Booking(user=user, date=target_date, start_time=target_time, total_time=total_time)
+        try:
+            hold = SlotHold.place(booking)
+        except ValueError as error:
+            raise GraphQLError(str(error))
+        return HoldSlot(hold=hold, success=True)
 
 
 class CreateAvailability(graphene.Mutation):
@@ -66,12 +147,13 @@ class CreateAvailability(graphene.Mutation):
     def mutate(cls, root, info, availability_from, availability_to, time_interval_mints):
         """Mutate operation creating user availability in the system."""
         user = info.context.user
-        availability = Availability.objects.create(
+        availability = Availability(
             user=user,
             from_time=availability_from,
             to_time=availability_to,
-            interval_mints=time_interval_mints
+            interval_mints=str(time_interval_mints)
         )
+        availability.coalesce()
         return CreateAvailability(availability=availability, success=True)
 
 
@@ -107,16 +189,15 @@ class UpdateAvailability(graphene.Mutation):
 
     @classmethod
     def perform_update(cls, availability, **kwargs):
-        """Updates the availability instance."""
-        db_fields = ["from_time", "to_time", "interval_mints"]
-        api_fields = ["availability_from", "availability_to", "time_interval_mints"]
-        key_mapping = zip(db_fields, api_fields)
-
-        for db_key, api_key in key_mapping:
+        """Updates the availability instance, saving only the fields which changed."""
+        before = {db_key: getattr(availability, db_key) for db_key in AVAILABILITY_FIELDS.values()}
+        for api_key, db_key in AVAILABILITY_FIELDS.items():
             if not kwargs.get(api_key):
                 continue
             setattr(availability, db_key, kwargs.get(api_key))
-        availability.save(update_fields=db_fields)
+        availability.interval_mints = str(availability.interval_mints)
+        changed = [db_key for db_key, value in before.items() if getattr(availability, db_key) != value]
+        availability.coalesce(update_fields=changed)
         return availability
 
 
@@ -138,3 +219,76 @@ class DeleteAvailability(graphene.Mutation):
         _, _id = from_global_id(id)
         Availability.objects.get(pk=_id, user=info.context.user).delete()
         return cls(success=True, error=None)
+
+
+class UpsertAvailabilities(graphene.Mutation):
+    """
+    OTD mutation class for creating & updating many user availabilities at once.
+    """
+    availabilities = graphene.List(AvailabilityType)
+    success = graphene.Boolean()
+    error = graphene.String()
+
+    class Arguments:
+        """Defines the arguments the mutation can take."""
+        availabilities = graphene.List(
+            graphene.NonNull(AvailabilityInput),
+            required=True,
+            description="Availabilities to create, or to update when their ID is provided.",
+        )
+
+    @classmethod
+    @user_required
+    def mutate(cls, root, info, availabilities):
+        """Mutate operation creating & updating user availabilities in one transaction."""
+        changes, global_ids = [], {}
+        for item in availabilities:
+            change = {
+                db_key: item[api_key] for api_key, db_key in AVAILABILITY_FIELDS.items()
+                if item.get(api_key) is not None
+            }
+            if item.get("id"):
+                _, change["id"] = from_global_id(item["id"])
+                global_ids[change["id"]] = item["id"]
+            elif len(change) < len(AVAILABILITY_FIELDS):
+                raise GraphQLError(
+                    "New availabilities require availabilityFrom, availabilityTo and timeIntervalMints."
+                )
+            changes.append(change)
+
+        try:
+            results = upsert_availabilities(info.context.user, changes)
+        except Availability.DoesNotExist as error:
+            ids = ", ".join(global_ids[key] for key in error.args[0])
+            raise GraphQLError(f"These IDs:{ids} don't seem to be belong you!")
+        except ValueError as error:
+            raise GraphQLError(str(error))
+        return UpsertAvailabilities(availabilities=results, success=True)
+
+
+class DeleteAvailabilities(graphene.Mutation):
+    """
+    OTD mutation class for deleting many user availabilities at once.
+    """
+    success = graphene.Boolean(description="Boolean indicating the status of the deletion.")
+    error = graphene.String(required=False)
+
+    class Arguments:
+        """Defines the arguments the mutation can take."""
+        ids = graphene.List(graphene.NonNull(graphene.String), required=True)
+
+    @classmethod
+    @user_required
+    def mutate(cls, root, info, ids):
+        """Mutate operation deleting user availabilities in one transaction."""
+        try:
+            delete_availabilities(info.context.user, [from_global_id(id)[1] for id in ids])
+        except Availability.DoesNotExist:
+            raise GraphQLError("Some of these IDs don't seem to be belong you!")
+        return cls(success=True, error=None)
+
+
+class ObtainJSONWebToken(mutations.ObtainJSONWebToken):
+    # graphql_auth login returning the scheduler user node, see `types.UserNode`.
+    __doc__ = mutations.ObtainJSONWebToken.__doc__
+    user = graphene.Field(UserNode)
@@ -0,0 +1,107 @@
+"""
+Day occupancy bitmaps for scheduler app.
+
+A day is split in slots of the shortest meeting interval of `INTERVAL_CHOICES`,
+bit `i` of a bitmap stands for the slot starting `i * SLOT_MINUTES` after
+midnight. For every (user, date) two bitmaps are kept on `DailyUtilization`:
+
+available: slots fully covered by the user's availability windows.
+booked: slots touched by a booking, both ends included, since bookings sharing
+    only a boundary minute count as overlapping.
+
+Both are conservative; booking validation only trusts the available bitmap
+and checks overlaps in SQL, the booked bitmap narrows down free slot searches.
+"""
+from datetime import time
+
+from django.conf import settings
+
+SLOT_MINUTES = min(int(interval) for interval, _ in settings.INTERVAL_CHOICES)
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+BITMAP_BYTES = (SLOTS_PER_DAY + 7) // 8
+EMPTY_BITMAP = bytes(BITMAP_BYTES)
+
+
+def to_bytes(bitmap):
+    """Packs the bitmap for its binary column."""
+    return bitmap.to_bytes(BITMAP_BYTES, 'little')
+
+
+def from_bytes(value):
+    """Unpacks a bitmap read from its binary column."""
+    return int.from_bytes(bytes(value or EMPTY_BITMAP), 'little')
+
+
+def _minute(value):
+    return value.hour * 60 + value.minute
+
+
+def slot_range_mask(first_slot, last_slot):
+    """Returns the bitmap with the slots from first to last included set."""
+    first_slot, last_slot = max(first_slot, 0), min(last_slot, SLOTS_PER_DAY - 1)
+    if last_slot < first_slot:
+        return 0
+    return ((1 << (last_slot - first_slot + 1)) - 1) << first_slot
+
+
+def touched_mask(start_time, end_time):
+    """Returns the slots touched by the time range, both ends included."""
+    last_minute = _minute(end_time) + (1 if end_time.second or end_time.microsecond else 0)
+    if end_time < start_time:
+        # Ends after midnight.
+        last_minute = 24 * 60 - 1
+    return slot_range_mask(_minute(start_time) // SLOT_MINUTES, last_minute // SLOT_MINUTES)
+
+
+def covered_mask(start_time, end_time):
+    """Returns the slots the time range needs to be available, end excluded."""
+    last_minute = _minute(end_time) + (1 if end_time.second or end_time.microsecond else 0)
+    if end_time < start_time:
+        last_minute = 24 * 60
+    return slot_range_mask(_minute(start_time) // SLOT_MINUTES, (last_minute - 1) // SLOT_MINUTES)
+
+
+def available_bitmap(merged_windows, day_start):
+    """Returns the slots fully covered by the merged (from_time, to_time) windows of the day."""
+    bitmap = 0
+    for from_time, to_time in merged_windows:
+        first_minute = (from_time - day_start).total_seconds() / 60
+        last_minute = (to_time - day_start).total_seconds() / 60
+        first_slot = -int(-first_minute // SLOT_MINUTES)  # ceil, partial slots are not available.
+        end_slot = int(last_minute // SLOT_MINUTES)
+        bitmap |= slot_range_mask(first_slot, end_slot - 1)
+    return bitmap
+
+
+def booked_bitmap(bookings):
+    """Returns the slots touched by the (start_time, end_time) bookings."""
+    bitmap = 0
+    for start_time, end_time in bookings:
+        bitmap |= touched_mask(start_time, end_time)
+    return bitmap
+
+
+def _runs(bitmap, length):
+    """Returns the bitmap of slots starting a run of `length` set slots."""
+    starts = bitmap
+    for shift in range(1, length):
+        starts &= bitmap >> shift
+    return starts & slot_range_mask(0, SLOTS_PER_DAY - length)
+
+
+def free_starts(available, booked, total_time):
+    """
+    Returns the start slots of a meeting of `total_time` minutes.
+
+    The slots covered by the meeting need to be available, and the slots it touches,
+    the one holding its end minute included, free of bookings.
+    """
+    covered = -(-total_time // SLOT_MINUTES)
+    touched = total_time // SLOT_MINUTES + 1
+    starts = _runs(available, covered) & _runs(~booked & slot_range_mask(0, SLOTS_PER_DAY - 1), touched)
+    return [slot for slot in range(SLOTS_PER_DAY) if starts >> slot & 1]
+
+
+def slot_time(slot):
+    """Returns the start time of the slot."""
+    return time(*divmod(slot * SLOT_MINUTES, 60))
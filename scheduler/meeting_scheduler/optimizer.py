@@ -0,0 +1,87 @@
+"""
+Selection-aware queryset optimization for scheduler app object types.
+"""
+from graphene.utils.str_converters import to_snake_case
+from graphql.language.ast import Field, FragmentSpread, InlineFragment
+
+
+def get_selections(info):
+    """
+    Returns the selection tree of the field being resolved.
+
+    The tree maps snake case field names to their own selection tree, connection
+    `edges { node }` wrappers are looked through, fragments are expanded.
+    """
+    tree = {}
+    for field_ast in info.field_asts:
+        _merge_selections(tree, field_ast.selection_set, info.fragments)
+
+    if 'edges' in tree:
+        return tree['edges'].get('node', {})
+    return tree
+
+
+def _merge_selections(tree, selection_set, fragments):
+    """Merges the fields of the selection set into the selection tree."""
+    if selection_set is None:
+        return
+    for selection in selection_set.selections:
+        if isinstance(selection, Field):
+            subtree = tree.setdefault(to_snake_case(selection.name.value), {})
+            _merge_selections(subtree, selection.selection_set, fragments)
+        elif isinstance(selection, FragmentSpread):
+            _merge_selections(tree, fragments[selection.name.value].selection_set, fragments)
+        elif isinstance(selection, InlineFragment):
+            _merge_selections(tree, selection.selection_set, fragments)
+
+
+def _get_lookups(model, tree):
+    """
+    Returns (only, select_related, prefetch_related) lookups for the model selection tree.
+
+    `only` is None when the selection contains fields that are not model fields, their
+    resolvers may read any column so the full row is loaded.
+    """
+    only, select_related, prefetch_related = [model._meta.pk.attname], [], []
+    fields = {field.name: field for field in model._meta.get_fields()}
+
+    for name, subtree in tree.items():
+        field = fields.get(name)
+        if name == 'id' or name.startswith('__'):
+            continue
+        if field is None:
+            only = None
+        elif (field.is_relation and not field.concrete) or field.many_to_many:
+            prefetch_related.append(name)
+        elif field.is_relation and subtree:
+            related_only, related_select, related_prefetch = _get_lookups(field.related_model, subtree)
+            if related_only is None:
+                related_only = [related.attname for related in field.related_model._meta.concrete_fields]
+            select_related.append(name)
+            select_related.extend(f'{name}__{lookup}' for lookup in related_select)
+            prefetch_related.extend(f'{name}__{lookup}' for lookup in related_prefetch)
+            if only is not None:
+                only.append(field.attname)
+                only.extend(f'{name}__{lookup}' for lookup in related_only)
+        elif only is not None:
+            only.append(field.attname)
+
+    return only, select_related, prefetch_related
+
+
+def optimize_queryset(queryset, info):
+    """
+    Restricts columns and joins of the queryset to what the GraphQL selection needs.
+
+    Applies `only()` for selected model fields, `select_related()` for selected
+    forward relations and `prefetch_related()` for selected reverse & many to
+    many relations.
+    """
+    only, select_related, prefetch_related = _get_lookups(queryset.model, get_selections(info))
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetch_related:
+        queryset = queryset.prefetch_related(*prefetch_related)
+    if only:
+        queryset = queryset.only(*only)
+    return queryset
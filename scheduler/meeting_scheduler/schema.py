@@ -4,12 +4,14 @@ from graphql_auth import mutations
 from graphql_jwt.decorators import user_passes_test
 from graphql_relay import from_global_id
 
-from .filters import BookingFilter
-from .models import Booking, Availability
+from .filters import AvailabilityFilter, BookingFilter
+from .models import Booking, Availability, DailyUtilization
 from .mutations import (
-    CreateBooking, CreateAvailability, DeleteAvailability, UpdateAvailability,
+    CreateBooking, CreateAvailability, DeleteAvailabilities, DeleteAvailability, HoldSlot, ObtainJSONWebToken,
+    UpdateAvailability, UpsertAvailabilities,
 )
-from .types import AvailabilityType, BookingType
+from .types import AvailabilityType, BookingType, DailyUtilizationType, UserNode
+from .utilization import free_slots
 
 
 class BookingQuery(graphene.ObjectType):
@@ -17,6 +19,19 @@ class BookingQuery(graphene.ObjectType):
     Describes entry point for fields to *read* data in the booking schema.
     """
     bookings = DjangoFilterConnectionField(BookingType, filterset_class=BookingFilter)
+    free_slots = graphene.List(
+        graphene.Time,
+        usernames=graphene.List(
+            graphene.NonNull(graphene.String), required=True, description="Usernames of the hosts."
+        ),
+        date=graphene.Date(required=True, description="Date of the meeting."),
+        total_time=graphene.Int(required=True, description="Length of the meeting in minutes."),
+    )
+
+    @classmethod
+    def resolve_free_slots(cls, root, info, usernames, date, total_time):
+        """Resolve the start times where all the hosts are free for the meeting"""
+        return free_slots(usernames, date, total_time)
 
     @classmethod
     def resolve_bookings_by_user(cls, root, info, username, **kwargs):
@@ -28,7 +43,7 @@ class AvailabilityQuery(graphene.ObjectType):
     """
     Describes entry point for fields to *read* data in the availability schema.
     """
-    availabilities = DjangoFilterConnectionField(AvailabilityType, )
+    availabilities = DjangoFilterConnectionField(AvailabilityType, filterset_class=AvailabilityFilter)
     availability = graphene.Field(AvailabilityType, id=graphene.String(
         required=True, description="ID of a availability to view"
     ))
@@ -44,7 +59,42 @@ class AvailabilityQuery(graphene.ObjectType):
     def resolve_availability(cls, root, info, id):
         """Resolve the user availability field"""
         __, _id = from_global_id(id)
-        return Availability.objects.get(id=_id, user=info.context.user)
+        return AvailabilityType.get_queryset(Availability.objects, info).get(id=_id, user=info.context.user)
+
+
+class UtilizationQuery(graphene.ObjectType):
+    """
+    Describes entry point for fields to *read* daily utilization of users.
+    """
+    utilization = graphene.List(
+        DailyUtilizationType,
+        username=graphene.String(required=True, description="Username of the host."),
+        date_from=graphene.Date(required=True, description="First date of the range."),
+        date_to=graphene.Date(required=True, description="Last date of the range."),
+    )
+
+    @classmethod
+    @user_passes_test(lambda user: user and not user.is_anonymous)
+    def resolve_utilization(cls, root, info, username, date_from, date_to):
+        """Resolve the user daily utilization in the date range, hosts only read their own"""
+        return DailyUtilization.objects.filter(
+            user=info.context.user, user__username=username, date__range=[date_from, date_to]
+        ).order_by('date')
+
+
+class UserQuery(graphene.ObjectType):
+    """
+    Describes entry point for fields to *read* users along with their upcoming bookings.
+    """
+    user = graphene.relay.Node.Field(UserNode)
+    users = DjangoFilterConnectionField(UserNode)
+    me = graphene.Field(UserNode)
+
+    @classmethod
+    def resolve_me(cls, root, info):
+        """Resolve the authenticated user"""
+        user = info.context.user
+        return user if user.is_authenticated else None
 
 
 class BookingMutation(graphene.ObjectType):
@@ -52,6 +102,7 @@ class BookingMutation(graphene.ObjectType):
     Describes entry point for fields to *create* data in bookings API.
     """
     create_booking = CreateBooking.Field()
+    hold_slot = HoldSlot.Field()
 
 
 class AvailabilityMutation(graphene.ObjectType):
@@ -61,11 +112,13 @@ class AvailabilityMutation(graphene.ObjectType):
     create_availability = CreateAvailability.Field()
     update_availability = UpdateAvailability.Field()
     delete_availability = DeleteAvailability.Field()
+    upsert_availabilities = UpsertAvailabilities.Field()
+    delete_availabilities = DeleteAvailabilities.Field()
 
 
 class UserMutation(graphene.ObjectType):
     """
     Describes entry point for fields to *login, verify token* data in user API.
     """
-    login = mutations.ObtainJSONWebToken.Field(description="Login and obtain token for the user")
+    login = ObtainJSONWebToken.Field(description="Login and obtain token for the user")
     verify_token = mutations.VerifyToken.Field(description="Verify if the token is valid.")
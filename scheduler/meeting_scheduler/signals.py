@@ -0,0 +1,55 @@
+"""
+Signal receivers for scheduler app.
+"""
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .loaders import invalidate_upcoming_bookings
+from .models import Availability, Booking
+from .utilization import availability_dates, refresh_utilization
+
+
+def _utilization_keys(instance):
+    """Returns the (user_id, dates) utilization keys the instance contributes to."""
+    if isinstance(instance, Booking):
+        return instance.user_id, [instance.date]
+    return instance.user_id, availability_dates(instance.from_time, instance.to_time)
+
+
+@receiver(pre_save, sender=Booking)
+@receiver(pre_save, sender=Availability)
+def remember_utilization_keys(sender, instance, **kwargs):
+    """Remembers the keys of the stored row so that moved rows refresh their old days too."""
+    instance._previous_utilization_keys = None
+    if instance.pk:
+        previous = sender.objects.filter(pk=instance.pk).first()
+        if previous is not None:
+            instance._previous_utilization_keys = _utilization_keys(previous)
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_save, sender=Availability)
+def update_utilization_on_save(sender, instance, **kwargs):
+    """Refreshes the daily utilization of the days touched by the saved row."""
+    previous = getattr(instance, '_previous_utilization_keys', None)
+    user_id, dates = _utilization_keys(instance)
+    if previous and previous[0] != user_id:
+        refresh_utilization(*previous)
+    elif previous:
+        dates = dates + previous[1]
+    refresh_utilization(user_id, dates)
+
+
+@receiver(post_delete, sender=Booking)
+@receiver(post_delete, sender=Availability)
+def update_utilization_on_delete(sender, instance, **kwargs):
+    """Refreshes the daily utilization of the days the deleted row contributed to."""
+    refresh_utilization(*_utilization_keys(instance), create=False)
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def invalidate_upcoming_bookings_on_write(sender, instance, **kwargs):
+    """Drops the cached upcoming bookings of the booking's user, and of its previous user when moved."""
+    previous = getattr(instance, '_previous_utilization_keys', None)
+    invalidate_upcoming_bookings({instance.user_id, previous and previous[0]})
@@ -0,0 +1,22 @@
+"""
+Background tasks for scheduler app, enqueued with `background.enqueue`.
+"""
+from django.conf import settings
+from django.core.mail import send_mail
+
+from .models import Booking
+
+
+def send_booking_confirmation(booking_id):
+    """Emails the booking confirmation to the person who made the booking."""
+    booking = Booking.objects.select_related('user').get(pk=booking_id)
+    send_mail(
+        subject=f'Your meeting with {booking.user.username} is booked',
+        message=(
+            f'Hi {booking.full_name},\n\n'
+            f'Your meeting with {booking.user.username} on {booking.date} '
+            f'from {booking.start_time:%H:%M} to {booking.end_time:%H:%M} is confirmed.\n'
+        ),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        recipient_list=[booking.email],
+    )
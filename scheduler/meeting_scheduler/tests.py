@@ -1,12 +1,34 @@
 """Meeting scheduler model tests"""
+import os
 import random
-from datetime import date, time, datetime
+import sqlite3
+import tempfile
+from datetime import date, time, datetime, timedelta
+from io import StringIO
+from unittest import mock
 
-from django.test import TestCase
+from django.conf import settings
+from django.core import mail
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connections, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
 
-from .models import Booking, UserModel, Availability
+from . import occupancy
+from .background import drain, enqueue, run_task
+from .bulk import upsert_availabilities
+from .management.commands.benchmark_sqlite import stress
+from .management.commands.generate_data import generate_user_rows
+from .management.commands.load_test import find_double_bookings, parse_mix, run_clients
+from .models import (
+    BackgroundTask, Booking, UserModel, Availability, DailyUtilization, SlotHold, lock_user,
+    overlapping_slot_filter,
+)
+from .tasks import send_booking_confirmation
 
 
+# Metrics are only recorded by the tests covering them, into temporary directories.
+@override_settings(METRICS={**settings.METRICS, 'ENABLED': False})
 class BaseTests(TestCase):
     def create_user(self, username="robo1"):
         return UserModel.objects.create(username=username, password="robo")
@@ -116,3 +138,437 @@ class AppTests(BaseTests):
                 str(value_error.exception),
                 f'Cannot book slot with {self.robo1.username} The slot is overlapping with other bookings.'
             )
+
+
+class SlotHoldTests(BaseTests):
+    def setUp(self) -> None:
+        self.robo1 = self.create_user()
+        self.create_availability(self.robo1)
+
+    def hold_slot(self, start_time=None, total_time=15):
+        """Hold user slot today at 11:00am -- 11:15am"""
+        booking = Booking(
+            user=self.robo1,
+            date=date.today(),
+            start_time=start_time or time(hour=11, minute=0, second=0),
+            total_time=total_time,
+        )
+        return SlotHold.place(booking)
+
+    def test_hold_blocks_other_bookings(self):
+        """Tests that an active hold rejects overlapping bookings and holds."""
+        self.hold_slot()
+        with self.assertRaises(ValueError) as value_error:
+            self.create_booking(user=self.robo1, total_time=15)
+        self.assertEqual(
+            str(value_error.exception),
+            f'{self.robo1.username} has this slot on hold by another booking.'
+        )
+        with self.assertRaises(ValueError):
+            self.hold_slot(start_time=time(hour=11, minute=10))
+
+    def test_second_hold_on_held_slot_fails(self):
+        """Tests that holds are checked & placed under the user's lock, so a held slot cannot be held twice."""
+        with mock.patch('scheduler.meeting_scheduler.models.lock_user', wraps=lock_user) as lock:
+            self.hold_slot()
+            with self.assertRaises(ValueError):
+                self.hold_slot()
+        lock.assert_called_with(self.robo1)
+        self.assertEqual(SlotHold.objects.count(), 1)
+
+    def test_hold_allows_non_overlapping_booking(self):
+        """Tests that a hold does not affect other slots."""
+        self.hold_slot()
+        self.create_booking(user=self.robo1, start_time=time(hour=11, minute=20), total_time=15)
+
+    def test_holder_can_book(self):
+        """Tests that the booking made with the hold token is valid."""
+        hold = self.hold_slot()
+        booking = Booking(
+            user=self.robo1, full_name='DemoX', email='a@a.com',
+            date=date.today(), start_time=time(hour=11), total_time=15,
+        )
+        self.assertTrue(booking.is_valid_new_booking(hold_token=hold.token))
+
+    def test_expired_holds(self):
+        """Tests that expired holds are ignored and cleaned up."""
+        hold = self.hold_slot()
+        SlotHold.objects.filter(pk=hold.pk).update(expires_at=datetime.now() - timedelta(seconds=1))
+
+        self.create_booking(user=self.robo1, start_time=time(hour=11, minute=20), total_time=15)
+        self.hold_slot()
+        self.assertFalse(SlotHold.objects.filter(pk=hold.pk).exists())
+
+        SlotHold.objects.update(expires_at=datetime.now() - timedelta(seconds=1))
+        call_command('purge_slot_holds', stdout=StringIO())
+        self.assertFalse(SlotHold.objects.exists())
+
+
+class DailyUtilizationTests(BaseTests):
+    def setUp(self) -> None:
+        self.robo1 = self.create_user()
+        self.availability = self.create_availability(self.robo1)
+
+    def get_utilization(self, target_date=None):
+        return DailyUtilization.objects.get(user=self.robo1, date=target_date or date.today())
+
+    def test_maintained_on_writes(self):
+        """Tests that bookings & availabilities keep the daily summary up to date."""
+        self.assertEqual(self.get_utilization().available_minutes, 45)
+
+        booking = self.create_booking(user=self.robo1, total_time=15)
+        self.assertEqual(self.get_utilization().booked_minutes, 15)
+        self.assertAlmostEqual(self.get_utilization().utilization, 1 / 3)
+
+        booking.delete()
+        self.assertEqual(self.get_utilization().booked_minutes, 0)
+
+        self.availability.delete()
+        self.assertEqual(self.get_utilization().available_minutes, 0)
+
+    def test_overlapping_availabilities_counted_once(self):
+        """Tests that overlapping availability windows are merged."""
+        today = date.today()
+        self.create_availability(
+            self.robo1,
+            from_time=datetime.combine(today, time(hour=11, minute=30)),
+            to_time=datetime.combine(today, time(hour=12, minute=0)),
+        )
+        self.assertEqual(self.get_utilization().available_minutes, 60)
+
+    def test_moved_availability(self):
+        """Tests that moving an availability refreshes its old and new days."""
+        tomorrow = date.today() + timedelta(days=1)
+        self.availability.from_time = datetime.combine(tomorrow, time(hour=9))
+        self.availability.to_time = datetime.combine(tomorrow, time(hour=10))
+        self.availability.save()
+
+        self.assertEqual(self.get_utilization().available_minutes, 0)
+        self.assertEqual(self.get_utilization(tomorrow).available_minutes, 60)
+
+    def test_user_deletion(self):
+        """Tests that deleting a user cascades without re-creating summary rows."""
+        self.create_booking(user=self.robo1, total_time=15)
+        self.robo1.delete()
+        self.assertFalse(DailyUtilization.objects.exists())
+
+    def test_rebuild(self):
+        """Tests that the rebuild command recomputes the table from scratch."""
+        self.create_booking(user=self.robo1, total_time=15)
+        DailyUtilization.objects.all().delete()
+
+        call_command('rebuild_utilization', stdout=StringIO())
+        utilization = self.get_utilization()
+        self.assertEqual((utilization.booked_minutes, utilization.available_minutes), (15, 45))
+
+
+class OccupancyTests(BaseTests):
+    def setUp(self) -> None:
+        self.robo1 = self.create_user()
+        self.create_availability(self.robo1)
+
+    def booking(self, start_time, total_time=15):
+        return Booking(
+            user=self.robo1, full_name='DemoX', email='a@a.com', date=date.today(),
+            start_time=start_time, total_time=total_time,
+        )
+
+    def test_bitmaps_maintained_on_writes(self):
+        """Tests that the day bitmaps mark fully available slots and slots touched by bookings."""
+        self.create_booking(user=self.robo1, total_time=15)
+        utilization = DailyUtilization.objects.get(user=self.robo1, date=date.today())
+
+        # 11:00 - 11:45 is available, the 11:00 - 11:15 booking touches the 11:00 & 11:15 slots.
+        self.assertEqual(occupancy.from_bytes(utilization.available_slots), 0b111 << 44)
+        self.assertEqual(occupancy.from_bytes(utilization.booked_slots), 0b11 << 44)
+
+    def test_valid_booking_skips_availability_query(self):
+        """Tests that the availability of a valid booking is read from the bitmap, its overlap from SQL."""
+        self.create_booking(user=self.robo1, total_time=15)
+        booking = self.booking(time(hour=11, minute=30))
+
+        # Hold check, day bitmap & overlap check.
+        with self.assertNumQueries(3):
+            self.assertTrue(booking.is_valid_new_booking())
+
+    def test_overlap_checked_in_sql(self):
+        """Tests that overlaps are decided in SQL, with or without a summary row or a stale bitmap."""
+        self.create_booking(user=self.robo1, total_time=15)
+        self.assertRaises(ValueError, self.booking(time(hour=11, minute=15)).is_valid_new_booking)
+
+        DailyUtilization.objects.update(booked_slots=occupancy.to_bytes(0))
+        self.assertRaises(ValueError, self.booking(time(hour=11, minute=15)).is_valid_new_booking)
+
+        DailyUtilization.objects.all().delete()
+        self.assertRaises(ValueError, self.booking(time(hour=11, minute=15)).is_valid_new_booking)
+        self.assertTrue(self.booking(time(hour=11, minute=30)).is_valid_new_booking())
+
+    def test_free_starts(self):
+        """Tests that free starts leave the slot of the end minute free of bookings."""
+        available, booked = 0b1111 << 44, 0b1 << 47
+        self.assertEqual(occupancy.free_starts(available, booked, 15), [44, 45])
+        self.assertEqual(occupancy.free_starts(available, 0, 60), [44])
+        self.assertEqual(occupancy.free_starts(available, 0, 20), [44, 45, 46])
+
+
+class AvailabilityCoalescingTests(BaseTests):
+    def setUp(self) -> None:
+        self.robo1 = self.create_user()
+        self.today = date.today()
+
+    def window(self, from_hour, to_hour, interval_mints='15', save=False):
+        availability = Availability(
+            user=self.robo1,
+            from_time=datetime.combine(self.today, time(hour=from_hour)),
+            to_time=datetime.combine(self.today, time(hour=to_hour)),
+            interval_mints=interval_mints,
+        )
+        if save:
+            availability.save()
+        return availability
+
+    def test_overlapping_and_adjacent_windows_merged(self):
+        """Tests that new windows merge overlapping and adjacent windows."""
+        self.window(9, 10).coalesce()
+        self.window(11, 12).coalesce()
+        availability = self.window(10, 11)
+
+        self.assertEqual(availability.coalesce(), 2)
+        self.assertEqual(
+            list(Availability.objects.values_list('from_time', 'to_time')),
+            [(datetime.combine(self.today, time(hour=9)), datetime.combine(self.today, time(hour=12)))]
+        )
+        self.assertEqual(DailyUtilization.objects.get(user=self.robo1).available_minutes, 180)
+
+    def test_different_intervals_not_merged(self):
+        """Tests that windows with different meeting intervals are kept apart."""
+        self.window(9, 10).coalesce()
+        self.assertEqual(self.window(9, 11, interval_mints='30').coalesce(), 0)
+        self.assertEqual(Availability.objects.count(), 2)
+
+    def test_contained_duplicate_window(self):
+        """Tests that re-creating an existing window does not duplicate it."""
+        self.window(9, 12).coalesce()
+        self.window(9, 12).coalesce()
+        self.assertEqual(Availability.objects.count(), 1)
+
+    def test_compact_command(self):
+        """Tests that the compaction command merges existing windows and reports removed rows."""
+        for from_hour, to_hour in [(9, 10), (10, 11), (10, 12), (14, 15)]:
+            self.window(from_hour, to_hour, save=True)
+
+        out = StringIO()
+        call_command('compact_availability', stdout=out)
+        self.assertEqual(out.getvalue().strip(), 'Removed 2 availability rows.')
+        self.assertEqual(
+            [(window.from_time.hour, window.to_time.hour) for window in Availability.objects.order_by('from_time')],
+            [(9, 12), (14, 15)]
+        )
+        self.assertEqual(DailyUtilization.objects.get(user=self.robo1).available_minutes, 240)
+
+    def upsert(self, *hours):
+        """Creates windows between the (from_hour, to_hour) pairs with `upsert_availabilities`."""
+        return upsert_availabilities(self.robo1, [
+            {'from_time': window.from_time, 'to_time': window.to_time, 'interval_mints': 15}
+            for window in (self.window(from_hour, to_hour) for from_hour, to_hour in hours)
+        ])
+
+    def test_bulk_window_merged_into_stored_window(self):
+        """Tests that a stored window widened by a bulk write is saved."""
+        stored = self.window(9, 10, save=True)
+
+        self.assertEqual([window.pk for window in self.upsert((10, 11))], [stored.pk])
+        stored.refresh_from_db()
+        self.assertEqual((stored.from_time.hour, stored.to_time.hour), (9, 11))
+        self.assertEqual(DailyUtilization.objects.get(user=self.robo1).available_minutes, 120)
+
+    def test_bulk_window_merges_stored_chain(self):
+        """Tests that stored windows touching each other beyond the written span are merged as well."""
+        for from_hour, to_hour in [(9, 10), (10, 11), (11, 12)]:
+            self.window(from_hour, to_hour, save=True)
+
+        self.upsert((8, 9))
+        self.assertEqual(
+            list(Availability.objects.values_list('from_time', 'to_time')),
+            [(datetime.combine(self.today, time(hour=8)), datetime.combine(self.today, time(hour=12)))]
+        )
+
+    def test_bulk_empty_window_rejected(self):
+        """Tests that bulk writes of windows not starting before they end write nothing."""
+        with self.assertRaises(ValueError):
+            self.upsert((9, 10), (11, 11))
+        self.assertFalse(Availability.objects.exists())
+
+
+def failing_task(message):
+    """Background task used by the tests, always fails."""
+    raise RuntimeError(message)
+
+
+class BackgroundTaskTests(BaseTests):
+    def setUp(self) -> None:
+        self.robo1 = self.create_user()
+        self.create_availability(self.robo1)
+
+    def test_booking_confirmation(self):
+        """Tests that the enqueued booking confirmation is sent by drain_tasks."""
+        booking = self.create_booking(user=self.robo1, total_time=15)
+        task = enqueue(send_booking_confirmation, booking_id=booking.pk)
+        self.assertEqual(task.status, BackgroundTask.PENDING)
+        self.assertEqual(len(mail.outbox), 0)
+
+        out = StringIO()
+        call_command('drain_tasks', stdout=out)
+        self.assertEqual(out.getvalue().strip(), 'Executed 1 background tasks.')
+        self.assertEqual(BackgroundTask.objects.get(pk=task.pk).status, BackgroundTask.DONE)
+        self.assertEqual(mail.outbox[0].to, ['a@a.com'])
+        self.assertIn(self.robo1.username, mail.outbox[0].subject)
+
+    def test_failing_task_retries(self):
+        """Tests that failing tasks are retried with back-off until they are marked as failed."""
+        task = enqueue(failing_task, message='boom')
+        with self.settings(BACKGROUND_TASKS={**settings.BACKGROUND_TASKS, 'MAX_ATTEMPTS': 2}):
+            run_task(task.pk)
+            task.refresh_from_db()
+            self.assertEqual((task.status, task.attempts), (BackgroundTask.PENDING, 1))
+            self.assertIn('RuntimeError: boom', task.last_error)
+            # Not due before its back-off.
+            self.assertIsNone(run_task(task.pk))
+
+            BackgroundTask.objects.filter(pk=task.pk).update(run_after=datetime.now())
+            run_task(task.pk)
+            task.refresh_from_db()
+            self.assertEqual((task.status, task.attempts), (BackgroundTask.FAILED, 2))
+
+    def test_stale_tasks_requeued(self):
+        """Tests that drain_tasks requeues tasks abandoned by a dead worker."""
+        task = enqueue(failing_task, message='boom')
+        BackgroundTask.objects.filter(pk=task.pk).update(status=BackgroundTask.RUNNING)
+
+        self.assertEqual(drain(), 0)
+        self.assertEqual(drain(stale_after=0), 1)
+
+
+@override_settings(METRICS={**settings.METRICS, 'ENABLED': False})
+class GenerateDataTests(TestCase):
+    def test_deterministic_by_seed(self):
+        """Tests that the same seed generates the same rows."""
+        def rows(seed):
+            return [
+                (type(row).__name__, row.date if isinstance(row, Booking) else row.from_time, row.interval_mints
+                 if isinstance(row, Availability) else row.start_time)
+                for row in generate_user_rows(random.Random(seed), 1, date(2022, 1, 3), 14)
+            ]
+
+        self.assertEqual(rows('1-0'), rows('1-0'))
+        self.assertNotEqual(rows('1-0'), rows('2-0'))
+
+    def test_generated_bookings_are_valid(self):
+        """Tests that generated bookings are inside availabilities and never overlap."""
+        call_command('generate_data', users=5, days=14, seed=3, chunk_size=50, stdout=StringIO())
+
+        self.assertEqual(UserModel.objects.filter(username__startswith='synthetic-').count(), 5)
+        self.assertTrue(Booking.objects.exists())
+        for booking in Booking.objects.all():
+            start = datetime.combine(booking.date, booking.start_time)
+            end = datetime.combine(booking.date, booking.end_time)
+            self.assertTrue(Availability.objects.filter(
+                user=booking.user_id, from_time__lte=start, to_time__gte=end,
+                interval_mints=str(booking.total_time),
+            ).exists())
+            self.assertFalse(Booking.objects.exclude(pk=booking.pk).filter(
+                user=booking.user_id, date=booking.date,
+            ).filter(overlapping_slot_filter(booking.start_time, booking.end_time)).exists())
+
+    def test_second_run_adds_users(self):
+        """Tests that running the command again continues the usernames of the previous run."""
+        call_command('generate_data', users=3, days=2, seed=3, stdout=StringIO())
+        call_command('generate_data', users=2, days=2, seed=3, stdout=StringIO())
+
+        self.assertEqual(
+            list(UserModel.objects.filter(username__startswith='synthetic-').order_by('username')
+                 .values_list('username', flat=True)),
+            [f'synthetic-{number:07d}' for number in range(5)],
+        )
+        self.assertFalse(Availability.objects.exclude(user__username__startswith='synthetic-').exists())
+
+
+class ProductionDatabaseTests(SimpleTestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.name = os.path.join(directory.name, 'production.sqlite3')
+
+    def connect(self, **options):
+        database = {**settings.PRODUCTION_DATABASE, 'NAME': self.name}
+        database['OPTIONS'] = {**database['OPTIONS'], **options}
+        connections.databases['production'] = database
+        self.addCleanup(connections.databases.pop, 'production')
+        self.addCleanup(connections.__delitem__, 'production')
+        self.addCleanup(connections['production'].close)
+        return connections['production']
+
+    def test_pragmas_applied(self):
+        """Tests that the pragmas are applied on connection creation."""
+        with self.connect().cursor() as cursor:
+            values = []
+            for pragma in ('journal_mode', 'synchronous', 'busy_timeout'):
+                cursor.execute(f'PRAGMA {pragma}')
+                values.append(cursor.fetchone()[0])
+        self.assertEqual(values, ['wal', 1, 20000])
+
+    def test_immediate_transactions(self):
+        """Tests that transactions take the write lock when they begin."""
+        connection = self.connect()
+        with transaction.atomic(using='production'):
+            connection.cursor().execute('SELECT 1')
+            other = sqlite3.connect(self.name, timeout=0)
+            self.addCleanup(other.close)
+            with self.assertRaisesMessage(sqlite3.OperationalError, 'database is locked'):
+                other.execute('BEGIN IMMEDIATE')
+
+    def test_invalid_transaction_mode(self):
+        """Tests that unknown transaction modes are rejected."""
+        with self.assertRaises(ImproperlyConfigured):
+            self.connect(transaction_mode='LAZY').ensure_connection()
+
+    def test_stress(self):
+        """Tests that concurrent writers do not fail with locked database errors."""
+        results = stress(settings.PRODUCTION_DATABASE, threads=4, seconds=0.5, write_ratio=0.5)
+        self.assertGreater(results['operations'], 0)
+        self.assertEqual(results['errors'], 0)
+
+
+class LoadTestTests(SimpleTestCase):
+    def test_find_double_bookings(self):
+        """Tests that overlapping & touching bookings of a host's day are reported."""
+        today = date.today()
+        bookings = [
+            (1, 1, today, time(9), time(9, 30)),
+            (2, 1, today, time(9, 30), time(10)),
+            (3, 1, today, time(11), time(11, 15)),
+            (4, 2, today, time(9), time(9, 30)),
+            (5, 1, today + timedelta(days=1), time(9), time(9, 30)),
+        ]
+        self.assertEqual(find_double_bookings(bookings), [(1, 2)])
+
+    def test_run_clients(self):
+        """Tests that clients log in first and outcomes are counted by operation."""
+        class FakeTransport:
+            def post(self, body, token=None):
+                if 'login(' in body['query']:
+                    return 200, {'data': {'login': {'token': 'token'}}}
+                if 'createBooking(' in body['query']:
+                    return 200, {'errors': [{'message': 'The slot is overlapping with other bookings.'}]}
+                return 200, {'data': {}}
+
+        scenario = {'hosts': ['host'], 'popularity': [1], 'dates': [date.today()]}
+        results = run_clients(
+            FakeTransport, scenario, parse_mix('bookings=1,createBooking=1'), clients=2, seconds=0.05
+        )
+
+        operations = results['operations']
+        self.assertEqual(operations['login']['ok'], 2)
+        self.assertEqual(operations['createBooking']['ok'], 0)
+        self.assertGreater(operations['createBooking']['rejected'], 0)
+        self.assertEqual(sum(stats['error'] for stats in operations.values()), 0)
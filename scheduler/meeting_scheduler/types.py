@@ -4,8 +4,13 @@ Custom scheduler app nodes
 import graphene
 from graphene import relay
 from graphene_django import DjangoObjectType
+from graphql_auth.schema import UserNode as AuthUserNode
+from graphql_auth.settings import graphql_auth_settings
 
-from .models import Booking, Availability, UserModel
+from .enums import Description
+from .loaders import UpcomingBookingsLoader, get_loader
+from .models import Booking, Availability, DailyUtilization, SlotHold, UserModel
+from .optimizer import get_selections, optimize_queryset
 
 
 class UserType(DjangoObjectType):
@@ -26,12 +31,25 @@ class AvailabilityType(DjangoObjectType):
         interfaces = (graphene.relay.Node,)
         filter_fields = ['user__username']
 
+    @classmethod
+    def get_queryset(cls, queryset, info):
+        """Loads only the columns and relations selected by the query."""
+        return optimize_queryset(queryset, info)
+
     @classmethod
     def resolve_interval_mints(cls, availability, info):
         """Resolves interval mints choice field."""
         return availability.get_interval_mints_display()
 
 
+class AvailabilityInput(graphene.InputObjectType):
+    """Availability Input Type Definition"""
+    id = graphene.String(description="ID of the availability to update, new availability when omitted.")
+    availability_from = graphene.DateTime(description=Description.availability_from)
+    availability_to = graphene.DateTime(description=Description.availability_to)
+    time_interval_mints = graphene.Int(description=Description.time_interval)
+
+
 class BookingType(DjangoObjectType):
     """Booking Object Type Definition"""
     user = graphene.Field(UserType)
@@ -39,3 +57,54 @@ class BookingType(DjangoObjectType):
     class Meta:
         model = Booking
         interfaces = (relay.Node,)
+
+    @classmethod
+    def get_queryset(cls, queryset, info):
+        """Loads only the columns and relations selected by the query."""
+        return optimize_queryset(queryset, info)
+
+
+class SlotHoldType(DjangoObjectType):
+    """Slot Hold Object Type Definition"""
+
+    class Meta:
+        model = SlotHold
+        fields = ("token", "date", "start_time", "end_time", "expires_at",)
+
+
+class DailyUtilizationType(DjangoObjectType):
+    """Daily Utilization Object Type Definition"""
+    utilization = graphene.Float(description="Ratio of booked to available minutes.")
+
+    class Meta:
+        model = DailyUtilization
+        fields = ("date", "booked_minutes", "available_minutes",)
+
+
+class UserNode(AuthUserNode):
+    """graphql_auth User Node Type Definition, with the user's upcoming bookings"""
+    upcoming_bookings_count = graphene.Int(description="Number of bookings starting from now on.")
+    next_booking = graphene.Field(BookingType, description="The first booking starting from now on.")
+
+    class Meta:
+        model = UserModel
+        filter_fields = graphql_auth_settings.USER_NODE_FILTER_FIELDS
+        exclude = graphql_auth_settings.USER_NODE_EXCLUDE_FIELDS
+        interfaces = (relay.Node,)
+
+    @classmethod
+    def get_queryset(cls, queryset, info):
+        """Joins the user status when status fields are selected."""
+        if get_selections(info).keys() & {"archived", "verified", "secondary_email"}:
+            return queryset.select_related("status")
+        return queryset
+
+    @classmethod
+    def resolve_upcoming_bookings_count(cls, user, info):
+        """Resolves the count with the upcoming bookings of the other users of the request."""
+        return get_loader(info.context, UpcomingBookingsLoader).load(user.pk).then(lambda entry: entry[0])
+
+    @classmethod
+    def resolve_next_booking(cls, user, info):
+        """Resolves the booking with the upcoming bookings of the other users of the request."""
+        return get_loader(info.context, UpcomingBookingsLoader).load(user.pk).then(lambda entry: entry[1])
@@ -0,0 +1,191 @@
+"""
+Per-user daily utilization & occupancy maintenance for scheduler app.
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, time, timedelta
+
+from . import occupancy
+from .models import Availability, Booking, DailyUtilization, SlotHold
+
+# {(user_id, date): create} refreshes collected by `deferred_refresh`.
+_deferred = ContextVar('deferred_utilization', default=None)
+
+
+def _day_span(target_date):
+    """Returns the start & end datetimes of the date."""
+    day_start = datetime.combine(target_date, time.min)
+    return day_start, day_start + timedelta(days=1)
+
+
+def _minutes(seconds):
+    return int(seconds // 60)
+
+
+def availability_dates(from_time, to_time):
+    """Returns the dates spanned by an availability window."""
+    current, last = from_time.date(), max(from_time, to_time).date()
+    dates = []
+    while current <= last:
+        dates.append(current)
+        current += timedelta(days=1)
+    return dates
+
+
+def merge_windows(windows, target_date):
+    """
+    Returns the union of (from_time, to_time) windows clipped to the date, as sorted
+    non-overlapping (from_time, to_time) pairs.
+    """
+    day_start, day_end = _day_span(target_date)
+    clipped = sorted(
+        (max(from_time, day_start), min(to_time, day_end))
+        for from_time, to_time in windows
+        if from_time < day_end and to_time > day_start and to_time > from_time
+    )
+
+    merged = []
+    for from_time, to_time in clipped:
+        if merged and from_time <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], to_time))
+        else:
+            merged.append((from_time, to_time))
+    return merged
+
+
+def summarize_day(bookings, windows, target_date):
+    """
+    Returns the daily utilization values of a date.
+    Arguments:
+        bookings: (start_time, end_time, total_time) of the bookings on the date.
+        windows: (from_time, to_time) of the availability windows spanning the date.
+        target_date: the date.
+    """
+    merged = merge_windows(windows, target_date)
+    return {
+        'booked_minutes': sum(total_time for _, _, total_time in bookings),
+        'available_minutes': _minutes(sum((to_time - from_time).total_seconds() for from_time, to_time in merged)),
+        'available_slots': occupancy.to_bytes(occupancy.available_bitmap(merged, _day_span(target_date)[0])),
+        'booked_slots': occupancy.to_bytes(
+            occupancy.booked_bitmap((start_time, end_time) for start_time, end_time, _ in bookings)
+        ),
+    }
+
+
+def compute_utilization(user_id, target_date):
+    """Computes the daily utilization values of the user on the date."""
+    bookings = Booking.objects.filter(user_id=user_id, date=target_date).values_list(
+        'start_time', 'end_time', 'total_time'
+    )
+    day_start, day_end = _day_span(target_date)
+    windows = Availability.objects.filter(
+        user_id=user_id, from_time__lt=day_end, to_time__gt=day_start
+    ).values_list('from_time', 'to_time')
+    return summarize_day(bookings, windows, target_date)
+
+
+def refresh_utilization(user_id, dates, create=True):
+    """
+    Recomputes the daily utilization rows of the user for the provided dates.
+
+    Only the rows of the user on those dates are read, so the cost of a write does
+    not depend on the size of the booking or availability tables.
+    Arguments:
+        user_id: id of the user.
+        dates: iterable of dates to refresh.
+        create: create missing rows, deletes only update existing rows so that
+            cascading user deletion never re-creates them.
+    """
+    if user_id is None:
+        return
+    deferred = _deferred.get()
+    if deferred is not None:
+        for target_date in dates:
+            deferred[(user_id, target_date)] = deferred.get((user_id, target_date), False) or create
+        return
+    for target_date in set(dates):
+        values = compute_utilization(user_id, target_date)
+        if create:
+            DailyUtilization.objects.update_or_create(user_id=user_id, date=target_date, defaults=values)
+        else:
+            DailyUtilization.objects.filter(user_id=user_id, date=target_date).update(**values)
+
+
+@contextmanager
+def deferred_refresh():
+    """
+    Collects the refreshes requested in the block, e.g. by the signals of a bulk write,
+    and runs each (user, date) refresh once on exit.
+    """
+    if _deferred.get() is not None:
+        yield
+        return
+    token = _deferred.set({})
+    try:
+        yield
+        deferred = _deferred.get()
+    finally:
+        _deferred.reset(token)
+    for (user_id, target_date), create in deferred.items():
+        refresh_utilization(user_id, [target_date], create=create)
+
+
+def rebuild_utilization(batch_size=1000):
+    """
+    Rebuilds the whole daily utilization table from bookings & availabilities.
+    Returns the number of rows written.
+    """
+    bookings = defaultdict(list)
+    for user_id, target_date, *booking in Booking.objects.exclude(user=None).values_list(
+            'user_id', 'date', 'start_time', 'end_time', 'total_time'
+    ).iterator():
+        bookings[(user_id, target_date)].append(booking)
+
+    windows = defaultdict(list)
+    for user_id, from_time, to_time in Availability.objects.exclude(user=None).values_list(
+            'user_id', 'from_time', 'to_time'
+    ).iterator():
+        for target_date in availability_dates(from_time, to_time):
+            windows[(user_id, target_date)].append((from_time, to_time))
+
+    rows = [
+        DailyUtilization(
+            user_id=user_id,
+            date=target_date,
+            **summarize_day(
+                bookings.get((user_id, target_date), ()), windows.get((user_id, target_date), ()), target_date
+            ),
+        )
+        for user_id, target_date in set(bookings) | set(windows)
+    ]
+    DailyUtilization.objects.all().delete()
+    DailyUtilization.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+def free_slots(usernames, target_date, total_time):
+    """
+    Returns the start times on the date where all the users can meet for `total_time` minutes.
+
+    Intersects the day occupancy bitmaps of the users, slots under an active hold
+    are treated as booked.
+    """
+    usernames = set(usernames)
+    rows = DailyUtilization.objects.filter(user__username__in=usernames, date=target_date).values_list(
+        'available_slots', 'booked_slots'
+    )
+    available = occupancy.slot_range_mask(0, occupancy.SLOTS_PER_DAY - 1) if usernames else 0
+    booked = occupancy.booked_bitmap(
+        SlotHold.objects.active().filter(user__username__in=usernames, date=target_date).values_list(
+            'start_time', 'end_time'
+        )
+    )
+    found = 0
+    for available_slots, booked_slots in rows:
+        available &= occupancy.from_bytes(available_slots)
+        booked |= occupancy.from_bytes(booked_slots)
+        found += 1
+    if found < len(usernames):
+        return []
+    return [occupancy.slot_time(slot) for slot in occupancy.free_starts(available, booked, total_time)]
@@ -45,6 +45,10 @@ INSTALLED_APPS = [
 SITE_ID = 1
 
 GRAPHENE = {
+    # Imported on first use so the schema is built lazily, by the first request.
+    "SCHEMA": "scheduler.api.schema.schema",
+    # Printed schema artifact written by `python manage.py graphql_schema`.
+    "SCHEMA_OUTPUT": str(BASE_DIR / "scheduler" / "api" / "schema.graphql"),
     "MIDDLEWARE": [
         "graphql_jwt.middleware.JSONWebTokenMiddleware",
     ],
@@ -66,6 +70,55 @@ GRAPHQL_JWT = {
         "graphql_auth.mutations.ObtainJSONWebToken",
     ],
 }
+GRAPHQL_AUTH = {
+    # Slot hold tokens and daily utilization are not readable through user nodes, a hold
+    # token is only returned to the client placing the hold.
+    "USER_NODE_EXCLUDE_FIELDS": ["password", "is_superuser", "user_slot_holds", "user_daily_utilization"],
+}
+
+# Maximum number of operations accepted in a single batched GraphQL request.
+GRAPHQL_BATCH_MAX_OPERATIONS = 20
+
+# Opt-in cProfile capture of GraphQL operations, see `api/profiling.py`.
+GRAPHQL_PROFILING = {
+    # Share of operations profiled without the signed `X-GraphQL-Profile` header.
+    "SAMPLE_RATE": 0.0,
+    "DIRECTORY": str(BASE_DIR / "profiles"),
+    "TOP": 30,
+    "TOKEN_MAX_AGE": 60 * 60,
+}
+
+# Database queries of GraphQL operations slower than the threshold are logged with their
+# query plan, see `api/slow_queries.py`. Opt-in as it tracks every resolver & query of the
+# operations while enabled.
+SLOW_QUERY_LOG = {
+    "ENABLED": False,
+    "THRESHOLD_MS": 100,
+    "EXPLAIN": True,
+    "FILE": str(BASE_DIR / "slow_queries.log"),
+}
+
+# Prometheus-style metrics served at `/api/metrics`, each worker process flushes its totals
+# to the shared directory, see `meeting_scheduler/metrics.py`. Enabled by the production profile.
+METRICS = {
+    "ENABLED": False,
+    "DIRECTORY": str(BASE_DIR / "metrics"),
+    "FLUSH_INTERVAL_SECONDS": 5,
+    # Files of exited worker processes are deleted once they are this old.
+    "STALE_AFTER_SECONDS": 24 * 60 * 60,
+}
+
+# Upcoming bookings of user nodes, cached until a booking of the user is written or the next
+# booking starts, see `meeting_scheduler/loaders.py`. Invalidations reach every worker process
+# only when the cache alias uses a shared backend, the production profile uses a file based one.
+# Entries of a process local cache (LocMemCache) expire after LOCAL_TIMEOUT instead, bounding
+# how long other workers serve stale counts.
+UPCOMING_BOOKINGS_CACHE = {
+    "ALIAS": "default",
+    "TIMEOUT": 60 * 60,
+    "LOCAL_TIMEOUT": 30,
+}
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sites.middleware.CurrentSiteMiddleware',
@@ -107,6 +160,30 @@ DATABASES = {
     }
 }
 
+# SQLite tuned for concurrent reads & writes: WAL journal, pragmas applied on connection
+# creation, persistent connections and immediate write transactions, see `scheduler/sqlite3/base.py`.
+# Used by `scheduler.settings_production`.
+PRODUCTION_DATABASE = {
+    **DATABASES['default'],
+    'ENGINE': 'scheduler.sqlite3',
+    'CONN_MAX_AGE': 600,
+    'OPTIONS': {
+        # Seconds a connection waits for a lock, also set as `busy_timeout` below.
+        'timeout': 20,
+        'transaction_mode': 'IMMEDIATE',
+        'pragmas': {
+            'journal_mode': 'WAL',
+            # Safe with WAL, the last transactions may only be lost on power failure.
+            'synchronous': 'NORMAL',
+            # Negative sizes are in KiB.
+            'cache_size': -64000,
+            'mmap_size': 256 * 1024 * 1024,
+            'busy_timeout': 20000,
+            'temp_store': 'MEMORY',
+        },
+    },
+}
+
 AUTH_USER_MODEL = 'meeting_scheduler.UserModel'
 
 # Password validation
@@ -159,3 +236,18 @@ INTERVAL_CHOICES = (
     (FORTYFIVE, 'Forty-Five (45) mints'),
 )
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+
+# Seconds a slot placed on hold by the `holdSlot` mutation stays reserved.
+SLOT_HOLD_TTL_SECONDS = 120
+
+# In-process background tasks, see `meeting_scheduler/background.py`.
+BACKGROUND_TASKS = {
+    "WORKERS": 4,
+    # Tasks submitted to the pool at once, the rest wait in the database for `drain_tasks`.
+    "QUEUE_SIZE": 100,
+    "MAX_ATTEMPTS": 3,
+    "RETRY_DELAY_SECONDS": 30,
+}
+
+# Seconds the result of a mutation called with an idempotency key is kept for retries.
+IDEMPOTENCY_KEY_TTL_SECONDS = 24 * 60 * 60
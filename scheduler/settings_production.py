@@ -0,0 +1,24 @@
+"""
+Production settings profile for scheduler project.
+
+Runs on the tuned SQLite backend, e.g.
+`DJANGO_SETTINGS_MODULE=scheduler.settings_production gunicorn scheduler.wsgi`.
+"""
+from .settings import *  # noqa: F401,F403 pylint: disable=wildcard-import,unused-wildcard-import
+from .settings import BASE_DIR, METRICS, PRODUCTION_DATABASE, UPCOMING_BOOKINGS_CACHE
+
+DATABASES = {
+    'default': PRODUCTION_DATABASE,
+}
+
+METRICS = {**METRICS, "ENABLED": True}
+
+# Shared by the worker processes of the host, so booking writes invalidate every worker's entries.
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'upcoming_bookings': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': str(BASE_DIR / 'cache' / 'upcoming_bookings'),
+    },
+}
+UPCOMING_BOOKINGS_CACHE = {**UPCOMING_BOOKINGS_CACHE, "ALIAS": "upcoming_bookings"}
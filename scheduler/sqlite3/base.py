@@ -0,0 +1,57 @@
+"""
+SQLite database backend tuned for concurrent writes.
+
+Accepts two `OPTIONS` on top of the `sqlite3.connect` ones:
+
+pragmas: {name: value} applied to every new connection, e.g. `journal_mode=WAL`
+    so that readers never block the writer.
+transaction_mode: `DEFERRED`, `IMMEDIATE` or `EXCLUSIVE`. Immediate transactions
+    take the write lock when they begin, a transaction which reads before it
+    writes then waits for `busy_timeout` instead of failing with "database is
+    locked" when it upgrades its lock.
+"""
+import re
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """SQLite database wrapper applying pragmas and the transaction mode from `OPTIONS`."""
+
+    @property
+    def pragmas(self):
+        return self.settings_dict['OPTIONS'].get('pragmas', {})
+
+    @property
+    def transaction_mode(self):
+        return self.settings_dict['OPTIONS'].get('transaction_mode')
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pragmas', None)
+        params.pop('transaction_mode', None)
+
+        if self.transaction_mode and self.transaction_mode.upper() not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f"transaction_mode must be one of {', '.join(TRANSACTION_MODES)}, not {self.transaction_mode!r}."
+            )
+        for name, value in self.pragmas.items():
+            if not re.fullmatch(r'\w+', name) or not re.fullmatch(r'-?\w+', str(value)):
+                raise ImproperlyConfigured(f"Invalid SQLite pragma {name}={value!r}.")
+        return params
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            connection.execute(f'PRAGMA {name} = {value}')
+        return connection
+
+    def _start_transaction_under_autocommit(self):
+        """Start transactions in the configured mode, `BEGIN` defaults to deferred."""
+        if self.transaction_mode:
+            self.cursor().execute(f'BEGIN {self.transaction_mode.upper()}')
+        else:
+            super()._start_transaction_under_autocommit()